@@ -0,0 +1,47 @@
+#!/bin/sh
+#
+# Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Run by the Nginx image's entrypoint to generate the upstream group of PHP-FPM backends
+# from the FASTCGI_* environment variables, see doc/configuration.md
+
+set -eu
+
+# Periodic resolution of upstream servers ("resolve") is only supported by Nginx 1.27.3 and
+# later; earlier versions resolve the backends once at startup
+resolve=
+if [ -n "${FASTCGI_RESOLVER-}" ]; then
+	if nginx -v 2>&1 |
+		awk -F '[/.]' '{ exit !($2 > 1 || $2 == 1 && ($3 > 27 || $3 == 27 && $4 >= 3)) }'
+	then
+		resolve=resolve
+	else
+		echo >&2 "${0##*/}: warning: FASTCGI_RESOLVER requires Nginx 1.27.3 or later;" \
+			"backends are resolved once at startup"
+	fi
+fi
+
+{
+	echo "# Generated at container startup by ${0##*/}"
+	echo
+	echo "upstream fastcgi {"
+	echo "	zone fastcgi 64k;"
+	echo "	least_conn;"
+	if [ -n "${resolve}" ]; then
+		echo "	resolver ${FASTCGI_RESOLVER} valid=${FASTCGI_RESOLVER_VALID};"
+	fi
+	for backend in $(echo "${FASTCGI_BACKENDS}" | tr , ' '); do
+		case ${backend} in
+			*:[0-9]*) ;;
+			*) backend=${backend}:9000 ;;
+		esac
+		echo "	server ${backend}" \
+			"max_fails=${FASTCGI_MAX_FAILS} fail_timeout=${FASTCGI_FAIL_TIMEOUT}" \
+			"${resolve}" | sed 's/ *$/;/'
+	done
+	echo "}"
+} >/etc/nginx/conf.d/upstream.conf
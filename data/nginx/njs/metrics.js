@@ -0,0 +1,168 @@
+/*
+ * Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+ *
+ * This Source Code Form is subject to the terms of the Mozilla Public
+ * License, v. 2.0. If a copy of the MPL was not distributed with this
+ * file, You can obtain one at http://mozilla.org/MPL/2.0/.
+ */
+
+/*
+ * Prometheus exporter for Nginx and PHP-FPM
+ *
+ * Request latencies and cache statuses are accumulated in a shared dictionary by
+ * observe(), which is called at the end of every logged request.  Nginx and PHP-FPM status
+ * pages are fetched with subrequests when metrics are rendered.
+ */
+
+const BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10];
+
+const NGINX_GAUGES = {
+	active: ["nginx_connections_active", "Open client connections"],
+	reading: ["nginx_connections_reading", "Connections reading request headers"],
+	writing: ["nginx_connections_writing", "Connections writing responses"],
+	waiting: ["nginx_connections_waiting", "Idle keep-alive connections"],
+};
+
+const NGINX_COUNTERS = {
+	accepts: ["nginx_connections_accepted_total", "Accepted client connections"],
+	handled: ["nginx_connections_handled_total", "Handled client connections"],
+	requests: ["nginx_http_requests_total", "Client requests"],
+};
+
+const FPM_GAUGES = {
+	"listen queue": ["phpfpm_listen_queue", "Requests waiting for a free worker"],
+	"max listen queue": ["phpfpm_max_listen_queue", "Largest number of waiting requests"],
+	"listen queue len": ["phpfpm_listen_queue_length", "Size of the listen queue"],
+	"idle processes": ["phpfpm_idle_processes", "Idle workers"],
+	"active processes": ["phpfpm_active_processes", "Workers serving requests"],
+	"total processes": ["phpfpm_total_processes", "Workers, both idle and active"],
+	"max active processes": ["phpfpm_max_active_processes", "Largest number of active workers"],
+};
+
+const FPM_COUNTERS = {
+	"accepted conn": ["phpfpm_accepted_connections_total", "Requests accepted by the pool"],
+	"max children reached": [
+		"phpfpm_max_children_reached_total", "Times the worker limit has been reached",
+	],
+	"slow requests": ["phpfpm_slow_requests_total", "Requests exceeding the slow-log timeout"],
+};
+
+
+function observe(r) {
+	const dict = ngx.shared.metrics;
+	const backend = r.variables.upstream_addr ? "php" : "static";
+	const duration = parseFloat(r.variables.request_time);
+
+	for (const le of BUCKETS) {
+		if (duration <= le) {
+			dict.incr(`bucket:${backend}:${le}`, 1, 0);
+		}
+	}
+	dict.incr(`count:${backend}`, 1, 0);
+	dict.incr(`sum:${backend}`, Math.round(duration * 1000), 0);
+
+	const cache = r.variables.upstream_cache_status;
+	if (cache) {
+		dict.incr(`cache:${cache.toLowerCase()}`, 1, 0);
+	}
+	return "";
+}
+
+
+async function render(r) {
+	const lines = [];
+	const [nginx, fpm] = await Promise.all([
+		r.subrequest("/stub_status"),
+		r.subrequest("/fpm_status"),
+	]);
+
+	renderNginx(lines, nginx);
+	renderFpm(lines, fpm);
+	renderObserved(lines, ngx.shared.metrics.items());
+
+	r.headersOut["Content-Type"] = "text/plain; version=0.0.4";
+	r.return(200, lines.join("\n") + "\n");
+}
+
+
+function renderNginx(lines, reply) {
+	const pattern = new RegExp(
+		/Active connections:\s*(\d+)\D+(\d+)\s+(\d+)\s+(\d+)\s+/.source +
+		/Reading:\s*(\d+)\s+Writing:\s*(\d+)\s+Waiting:\s*(\d+)/.source,
+	);
+	const match = pattern.exec(reply.status == 200 ? reply.responseText : "");
+	if (!match) {
+		return;
+	}
+	const values = {
+		active: match[1], accepts: match[2], handled: match[3], requests: match[4],
+		reading: match[5], writing: match[6], waiting: match[7],
+	};
+	addValues(lines, "gauge", NGINX_GAUGES, values);
+	addValues(lines, "counter", NGINX_COUNTERS, values);
+}
+
+
+function renderFpm(lines, reply) {
+	let status = null;
+	try {
+		status = reply.status == 200 ? JSON.parse(reply.responseText) : null;
+	} catch (e) {
+		// An unparsable status is reported as the pool being down
+	}
+
+	addFamily(lines, "phpfpm_up", "gauge", "Whether the PHP-FPM status page was reachable");
+	lines.push(`phpfpm_up ${status ? 1 : 0}`);
+	if (!status) {
+		return;
+	}
+	addValues(lines, "gauge", FPM_GAUGES, status);
+	addValues(lines, "counter", FPM_COUNTERS, status);
+}
+
+
+function renderObserved(lines, items) {
+	const observed = {};
+	for (const [key, value] of items) {
+		observed[key] = value;
+	}
+
+	addFamily(
+		lines, "nginx_cache_requests_total", "counter",
+		"Requests served through the FastCGI cache, by cache status",
+	);
+	for (const key of Object.keys(observed).filter(k => k.startsWith("cache:")).sort()) {
+		lines.push(`nginx_cache_requests_total{status="${key.slice(6)}"} ${observed[key]}`);
+	}
+
+	const name = "nginx_http_request_duration_seconds";
+	addFamily(lines, name, "histogram", "Time taken to serve requests, by backend");
+	for (const backend of ["php", "static"]) {
+		const count = observed[`count:${backend}`] || 0;
+		for (const le of BUCKETS) {
+			const value = observed[`bucket:${backend}:${le}`] || 0;
+			lines.push(`${name}_bucket{backend="${backend}",le="${le}"} ${value}`);
+		}
+		lines.push(`${name}_bucket{backend="${backend}",le="+Inf"} ${count}`);
+		lines.push(`${name}_sum{backend="${backend}"} ${(observed[`sum:${backend}`] || 0) / 1000}`);
+		lines.push(`${name}_count{backend="${backend}"} ${count}`);
+	}
+}
+
+
+function addFamily(lines, name, type, help) {
+	lines.push(`# HELP ${name} ${help}`, `# TYPE ${name} ${type}`);
+}
+
+
+function addValues(lines, type, metrics, values) {
+	for (const [key, [name, help]] of Object.entries(metrics)) {
+		if (key in values) {
+			addFamily(lines, name, type, help);
+			lines.push(`${name} ${values[key]}`);
+		}
+	}
+}
+
+
+export default {observe, render};
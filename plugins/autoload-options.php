@@ -0,0 +1,242 @@
+<?php
+/**
+ * Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+ *
+ * Plugin Name: Autoloaded Options Management
+ * Plugin URI: https://code.kodo.org.uk/singing-chimes.co.uk/wordpress/tree/master/plugins
+ * Description: Adds the "wp autoload" command for reporting and compacting autoloaded options
+ * Licence: MPL-2.0
+ * Licence URI: https://www.mozilla.org/en-US/MPL/2.0/
+ * Author: Dominik Sekotill
+ * Author URI: https://code.kodo.org.uk/dom
+ */
+
+
+if ( defined( 'WP_CLI' ) && WP_CLI ):
+
+/**
+ * Report on and reduce the size of options loaded on every request.
+ */
+class Autoload_Options_Command {
+
+	/**
+	 * Option name prefixes which must never be matched by plugin slugs
+	 */
+	const PROTECTED_PREFIXES = array(
+		'_site_transient', '_transient', 'active_plugins', 'cron', 'rewrite_rules',
+		'theme_mods', 'widget',
+	);
+
+	/**
+	 * Report the total size of autoloaded options and the largest of them.
+	 *
+	 * ## OPTIONS
+	 *
+	 * [--limit=<count>]
+	 * : Number of the largest options to list.
+	 * ---
+	 * default: 20
+	 * ---
+	 *
+	 * [--format=<format>]
+	 * : Output format for the list of options.
+	 * ---
+	 * default: table
+	 * options:
+	 *   - table
+	 *   - json
+	 *   - csv
+	 * ---
+	 *
+	 * @when after_wp_load
+	 */
+	public function report( $args, $assoc_args ) {
+		$options = self::get_autoloaded();
+		$limit = (int) $assoc_args['limit'];
+
+		if ( $assoc_args['format'] == 'table' ) {
+			WP_CLI::log( sprintf(
+				'Autoloaded options: %d totalling %s',
+				count( $options ), size_format( self::total( $options ) )
+			) );
+		}
+		WP_CLI\Utils\format_items(
+			$assoc_args['format'], array_slice( $options, 0, $limit ), array( 'name', 'size' )
+		);
+	}
+
+	/**
+	 * Warn if the total size of autoloaded options exceeds a budget.
+	 *
+	 * ## OPTIONS
+	 *
+	 * --budget=<size>
+	 * : Maximum total size, in bytes; "K", "M" and "G" suffixes are accepted.
+	 *
+	 * [--limit=<count>]
+	 * : Number of the largest options to list when the budget is exceeded.
+	 * ---
+	 * default: 5
+	 * ---
+	 *
+	 * @when after_wp_load
+	 */
+	public function check( $args, $assoc_args ) {
+		$options = self::get_autoloaded();
+		$budget = wp_convert_hr_to_bytes( $assoc_args['budget'] );
+		$total = self::total( $options );
+
+		if ( $total <= $budget ) {
+			return;
+		}
+
+		$largest = array_map(
+			function( $opt ) { return "{$opt['name']} ({$opt['size']})"; },
+			array_slice( $options, 0, (int) $assoc_args['limit'] )
+		);
+		WP_CLI::warning( sprintf(
+			'Autoloaded options total %d bytes, exceeding the budget of %d bytes; largest: %s',
+			$total, $budget, implode( ', ', $largest )
+		) );
+	}
+
+	/**
+	 * Stop loading options on every request and purge expired transients.
+	 *
+	 * ## OPTIONS
+	 *
+	 * [<pattern>...]
+	 * : Shell wildcard patterns matching names of options known to be safe to stop
+	 * autoloading.
+	 *
+	 * [--orphaned]
+	 * : Stop autoloading options prefixed with the slug of an inactive or removed plugin.
+	 *
+	 * [--transients]
+	 * : Delete all expired transients.
+	 *
+	 * [--min-size=<size>]
+	 * : Only change options at least this size, in bytes.
+	 * ---
+	 * default: 0
+	 * ---
+	 *
+	 * [--dry-run]
+	 * : Report the options which would be changed without changing them.
+	 *
+	 * @when after_wp_load
+	 */
+	public function compact( $args, $assoc_args ) {
+		$min_size = wp_convert_hr_to_bytes( $assoc_args['min-size'] );
+		$dry_run = WP_CLI\Utils\get_flag_value( $assoc_args, 'dry-run', false );
+		$patterns = $args;
+
+		if ( WP_CLI\Utils\get_flag_value( $assoc_args, 'orphaned', false ) ) {
+			foreach ( self::get_orphan_prefixes() as $prefix ) {
+				$patterns[] = "{$prefix}_*";
+			}
+		}
+
+		$action = $dry_run ? 'Would disable autoload' : 'Disabling autoload';
+		$changes = array();
+		foreach ( self::get_autoloaded() as $opt ) {
+			if ( $opt['size'] < $min_size ) {
+				break;
+			}
+			foreach ( $patterns as $pattern ) {
+				if ( fnmatch( $pattern, $opt['name'] ) ) {
+					$changes[ $opt['name'] ] = false;
+					WP_CLI::log( "{$action}: {$opt['name']} ({$opt['size']} bytes)" );
+					break;
+				}
+			}
+		}
+
+		if ( $changes && !$dry_run ) {
+			wp_set_option_autoload_values( $changes );
+		}
+
+		if ( WP_CLI\Utils\get_flag_value( $assoc_args, 'transients', false ) ) {
+			if ( $dry_run ) {
+				WP_CLI::log( 'Would delete expired transients' );
+			} else {
+				delete_expired_transients( true );
+				WP_CLI::log( 'Deleted expired transients' );
+			}
+		}
+	}
+
+	/**
+	 * Return autoloaded options as name and size pairs, largest first
+	 */
+	private static function get_autoloaded() {
+		global $wpdb;
+
+		$values = function_exists( 'wp_autoload_values_to_autoload' )
+			? wp_autoload_values_to_autoload()
+			: array( 'yes' );
+		$placeholders = implode( ',', array_fill( 0, count( $values ), '%s' ) );
+
+		return array_map(
+			function( $row ) {
+				return array( 'name' => $row['name'], 'size' => (int) $row['size'] );
+			},
+			$wpdb->get_results(
+				$wpdb->prepare(
+					"SELECT option_name AS name, LENGTH(option_value) AS size " .
+					"FROM {$wpdb->options} WHERE autoload IN ($placeholders) " .
+					"ORDER BY size DESC",
+					$values
+				),
+				ARRAY_A
+			)
+		);
+	}
+
+	/**
+	 * Return the option name prefixes of plugins which are not active
+	 *
+	 * Prefixes are derived from the slugs (directory names) of installed but inactive
+	 * plugins, and of plugins recently deactivated or removed.  Short or generic slugs are
+	 * skipped to avoid matching core options.
+	 */
+	private static function get_orphan_prefixes() {
+		require_once ABSPATH . 'wp-admin/includes/plugin.php';
+
+		$slugs = array_diff(
+			array_merge(
+				array_keys( get_plugins() ),
+				array_keys( (array) get_option( 'recently_activated', array() ) )
+			),
+			(array) get_option( 'active_plugins', array() )
+		);
+
+		$prefixes = array();
+		foreach ( $slugs as $plugin ) {
+			$slug = dirname( $plugin ) == '.' ? basename( $plugin, '.php' ) : dirname( $plugin );
+			foreach ( array( $slug, str_replace( '-', '_', $slug ) ) as $prefix ) {
+				if ( strlen( $prefix ) < 4 ) {
+					continue;
+				}
+				foreach ( self::PROTECTED_PREFIXES as $protected ) {
+					if ( strpos( $protected, $prefix ) === 0 || strpos( $prefix, $protected ) === 0 ) {
+						continue 2;
+					}
+				}
+				$prefixes[ $prefix ] = $prefix;
+			}
+		}
+		return array_values( $prefixes );
+	}
+
+	/**
+	 * Return the total size of a list of options
+	 */
+	private static function total( array $options ) {
+		return array_sum( array_column( $options, 'size' ) );
+	}
+}
+
+WP_CLI::add_command( 'autoload', 'Autoload_Options_Command' );
+
+endif;
@@ -0,0 +1,122 @@
+<?php
+/**
+ * Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+ *
+ * Plugin Name: Cron Lease
+ * Plugin URI: https://code.kodo.org.uk/singing-chimes.co.uk/wordpress/tree/master/plugins
+ * Description: Adds the "wp cron-lease" command for electing a single cron runner among replicas
+ * Licence: MPL-2.0
+ * Licence URI: https://www.mozilla.org/en-US/MPL/2.0/
+ * Author: Dominik Sekotill
+ * Author URI: https://code.kodo.org.uk/dom
+ */
+
+
+if ( defined( 'WP_CLI' ) && WP_CLI ):
+
+/**
+ * Manage a time-limited lease, stored in the options table, on running cron events.
+ *
+ * The lease is a single option row with the value "<holder> <expiry>", where the expiry is
+ * a Unix timestamp from the database server's clock, so the clocks of the replicas do not
+ * need to agree.  The row is only ever changed with single, conditional UPDATE statements,
+ * so at most one holder can take or renew it at a time.
+ */
+class Cron_Lease_Command {
+
+	const OPTION = 'cron_lease';
+
+	/**
+	 * Take or renew the lease, if it is free, expired or already held by the holder.
+	 *
+	 * Prints the current holder and expiry time of the lease, and exits with a non-zero
+	 * status if it is held by another holder.
+	 *
+	 * ## OPTIONS
+	 *
+	 * <holder>
+	 * : A name unique to the runner requesting the lease, such as a hostname.
+	 *
+	 * [--ttl=<seconds>]
+	 * : Time after which the lease expires unless renewed.
+	 * ---
+	 * default: 60
+	 * ---
+	 *
+	 * @when after_wp_load
+	 */
+	public function acquire( $args, $assoc_args ) {
+		global $wpdb;
+		list( $holder ) = $args;
+
+		$wpdb->query( $wpdb->prepare(
+			"INSERT IGNORE INTO {$wpdb->options} (option_name, option_value, autoload) " .
+			"VALUES (%s, '- 0', 'no')",
+			self::OPTION
+		) );
+		$wpdb->query( $wpdb->prepare(
+			"UPDATE {$wpdb->options} SET option_value = CONCAT(%s, ' ', UNIX_TIMESTAMP() + %d) " .
+			"WHERE option_name = %s AND (" .
+			"SUBSTRING_INDEX(option_value, ' ', 1) = %s OR " .
+			"CAST(SUBSTRING_INDEX(option_value, ' ', -1) AS UNSIGNED) < UNIX_TIMESTAMP())",
+			$holder, (int) $assoc_args['ttl'], self::OPTION, $holder
+		) );
+
+		list( $current, $expiry ) = self::get();
+		WP_CLI::line( "{$current} {$expiry}" );
+		if ( $current != $holder ) {
+			WP_CLI::halt( 1 );
+		}
+	}
+
+	/**
+	 * Give up the lease, if it is held by the holder.
+	 *
+	 * ## OPTIONS
+	 *
+	 * <holder>
+	 * : The name the lease was acquired with.
+	 *
+	 * @when after_wp_load
+	 */
+	public function release( $args ) {
+		global $wpdb;
+		list( $holder ) = $args;
+
+		$wpdb->query( $wpdb->prepare(
+			"UPDATE {$wpdb->options} SET option_value = '- 0' " .
+			"WHERE option_name = %s AND SUBSTRING_INDEX(option_value, ' ', 1) = %s",
+			self::OPTION, $holder
+		) );
+	}
+
+	/**
+	 * Print the current holder and expiry time of the lease.
+	 *
+	 * A holder of "-" indicates the lease has been released.
+	 *
+	 * @when after_wp_load
+	 */
+	public function status() {
+		list( $holder, $expiry ) = self::get();
+		WP_CLI::line( sprintf( '%s %s', $holder, gmdate( 'Y-m-d\TH:i:s\Z', $expiry ) ) );
+	}
+
+	/**
+	 * Return the holder and expiry time of the lease, bypassing any object cache
+	 */
+	private static function get() {
+		global $wpdb;
+
+		$value = $wpdb->get_var( $wpdb->prepare(
+			"SELECT option_value FROM {$wpdb->options} WHERE option_name = %s",
+			self::OPTION
+		) );
+		list( $holder, $expiry ) = array_pad( explode( ' ', (string) $value, 2 ), 2, 0 );
+		return array( $holder ?: '-', (int) $expiry );
+	}
+}
+
+WP_CLI::add_command( 'cron-lease', 'Cron_Lease_Command' );
+
+endif;
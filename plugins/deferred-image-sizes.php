@@ -0,0 +1,65 @@
+<?php
+/**
+ * Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+ *
+ * Plugin Name: Deferred Image Sizes
+ * Plugin URI: https://code.kodo.org.uk/singing-chimes.co.uk/wordpress/tree/master/plugins
+ * Description: Generates the intermediate sizes of uploaded images from cron instead of during uploads
+ * Licence: MPL-2.0
+ * Licence URI: https://www.mozilla.org/en-US/MPL/2.0/
+ * Author: Dominik Sekotill
+ * Author URI: https://code.kodo.org.uk/dom
+ */
+
+
+if ( defined( 'IMAGE_DEFER_SIZES' ) && IMAGE_DEFER_SIZES ):
+
+// Skip Sizes During Uploads
+//
+// Until the sizes are generated, image functions fall back to the original image as the
+// attachment's metadata lists no sizes.  Commands such as "wp media regenerate" still
+// generate sizes immediately.
+
+add_filter(
+	'intermediate_image_sizes_advanced',
+
+	function( $sizes, $metadata, $attachment_id ) {
+		if ( !$sizes || ( defined( 'WP_CLI' ) && WP_CLI ) ) {
+			return $sizes;
+		}
+		if ( doing_action( 'generate_deferred_image_sizes' ) ) {
+			return $sizes;
+		}
+		$args = array( (int) $attachment_id );
+		if ( !wp_next_scheduled( 'generate_deferred_image_sizes', $args ) ) {
+			wp_schedule_single_event( time(), 'generate_deferred_image_sizes', $args );
+		}
+		return array();
+	},
+
+	10, 3
+);
+
+
+// Generate Sizes From Cron
+
+add_action(
+	'generate_deferred_image_sizes',
+
+	function( $attachment_id ) {
+		require_once ABSPATH . 'wp-admin/includes/image.php';
+
+		if ( !wp_attachment_is_image( $attachment_id ) ) {
+			return;
+		}
+		$result = wp_update_image_subsizes( $attachment_id );
+		if ( is_wp_error( $result ) ) {
+			error_log( sprintf(
+				'Generating image sizes of attachment %d failed: %s',
+				$attachment_id, $result->get_error_message()
+			) );
+		}
+	}
+);
+
+endif;
@@ -0,0 +1,41 @@
+<?php
+/**
+ * Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+ *
+ * Plugin Name: Pre-rendered Pages
+ * Plugin URI: https://code.kodo.org.uk/singing-chimes.co.uk/wordpress/tree/master/plugins
+ * Description: Marks pre-rendered pages as outdated when the site's content changes
+ * Licence: MPL-2.0
+ * Licence URI: https://www.mozilla.org/en-US/MPL/2.0/
+ * Author: Dominik Sekotill
+ * Author URI: https://code.kodo.org.uk/dom
+ */
+
+
+// Content Changes
+//
+// The container entrypoint re-renders pages in the background when the value of the
+// "prerender_generation" option changes, see PRERENDER in doc/configuration.md
+
+$prerender_bump = function() {
+	static $bumped = false;
+	if ( !$bumped ) {
+		$bumped = true;
+		update_option( 'prerender_generation', uniqid(), false );
+	}
+};
+
+add_action( 'save_post', function( $post_id ) use ( $prerender_bump ) {
+	if ( !wp_is_post_revision( $post_id ) && !wp_is_post_autosave( $post_id ) ) {
+		$prerender_bump();
+	}
+} );
+
+foreach ( array(
+	'deleted_post', 'created_term', 'edited_term', 'delete_term', 'wp_update_nav_menu',
+	'customize_save_after', 'switch_theme', 'update_option_sidebars_widgets',
+) as $hook ) {
+	add_action( $hook, $prerender_bump );
+}
+
+unset( $prerender_bump, $hook );
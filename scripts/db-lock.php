@@ -0,0 +1,49 @@
+<?php
+/**
+ * Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+ *
+ * This Source Code Form is subject to the terms of the Mozilla Public
+ * License, v. 2.0. If a copy of the MPL was not distributed with this
+ * file, You can obtain one at http://mozilla.org/MPL/2.0/.
+ *
+ * Hold a named MySQL advisory lock (GET_LOCK) for as long as standard input is open
+ *
+ * Usage: php db-lock.php <name> <timeout>
+ *
+ * Connection details are read from the DB_LOCK_CONFIG environment variable, which must
+ * contain the output of "wp config list DB_ --format=json".  The lock is scoped to the
+ * database, so sites sharing a server do not contend for it.
+ *
+ * Once the lock is acquired "locked" is written to standard output; if the timeout (in
+ * seconds) passes first, "timeout" is written and the process exits, and if the server
+ * fails to take the lock "error" is written and the process exits.  The lock is released
+ * when standard input is closed, or when the process dies and its connection is closed.
+ */
+
+list( , $name, $timeout ) = $argv;
+
+$config = array_column( json_decode( getenv( 'DB_LOCK_CONFIG' ), true ), 'value', 'name' );
+list( $host, $port ) = array_pad( explode( ':', $config['DB_HOST'], 2 ), 2, null );
+
+$db = new mysqli(
+	$host, $config['DB_USER'], $config['DB_PASSWORD'], $config['DB_NAME'],
+	$port ? (int) $port : 3306
+);
+$lock = $db->real_escape_string( "{$config['DB_NAME']}:{$name}" );
+
+try {
+	$result = $db->query( sprintf( "SELECT GET_LOCK('%s', %d)", $lock, $timeout ) );
+	$locked = $result ? $result->fetch_row()[0] : null;
+} catch ( mysqli_sql_exception $e ) {
+	// For instance if the query is killed while waiting
+	$locked = null;
+}
+if ( $locked != 1 ) {
+	echo $locked === null ? "error\n" : "timeout\n";
+	exit( 1 );
+}
+echo "locked\n";
+
+while ( fgets( STDIN ) !== false );
+
+$db->query( sprintf( "SELECT RELEASE_LOCK('%s')", $lock ) );
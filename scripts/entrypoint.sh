@@ -17,12 +17,20 @@ declare -r DEFAULT_THEME=twentytwentyfour
 declare -r WORKER_USER=www-data
 declare -r CONFIG_DIR=/etc/wordpress
 declare -r WORK_DIR=${PWD}
+declare -rx CRON_PIDFILE=/run/wp-cron.pid
+declare -r BAKE_LOCK=${WORK_DIR}/bake.lock
+declare -r WP_ORG_API=https://api.wordpress.org
+declare -r SETUP_LOCK=wordpress-setup
+declare -rx PRERENDER_DIR=static/wp/_prerendered
 
 declare DB_HOST DB_NAME DB_USER DB_PASS
 declare HOME_URL SITE_URL
 declare -a THEMES=( ${THEMES-} )
 declare -a PLUGINS=( ${PLUGINS-} )
 declare -a LANGUAGES=( ${LANGUAGES-} )
+declare -a PRERENDER=( ${PRERENDER-} )
+# Split without globbing, as the items may be option name patterns
+read -ra AUTOLOAD_COMPACT <<<"${AUTOLOAD_COMPACT-}"
 declare -a STATIC_PATTERNS=(
 	${STATIC_PATTERNS-}
 	".*"
@@ -36,6 +44,7 @@ declare -a STATIC_PATTERNS=(
 	"README"
 	"readme.html"
 	"composer.*"
+	"bake.lock"
 )
 declare -a PHP_DIRECTIVES=(
 	${PHP_DIRECTIVES-}
@@ -46,6 +55,12 @@ declare -a WP_CONFIGS=(
 	${WP_CONFIGS-${CONFIG_DIR}/**/*config.php}
 )
 
+# Exported for expansion in the FPM pool configuration
+declare -x FPM_SLOWLOG_TIMEOUT=${FPM_SLOWLOG_TIMEOUT:-0}
+declare -x FPM_SLOWLOG_DEPTH=${FPM_SLOWLOG_DEPTH:-20}
+declare -x FPM_TERMINATE_TIMEOUT=${FPM_TERMINATE_TIMEOUT:-0}
+declare -x FPM_SHUTDOWN_TIMEOUT=${FPM_SHUTDOWN_TIMEOUT:-10s}
+
 
 timestamp()
 {
@@ -57,6 +72,13 @@ fatal()
 	timestamp >&2 "FATAL:" "$@"
 }
 
+stage()
+{
+	# Log the start of each phase of preparation, for startup timing
+	timestamp "Stage: $1"
+	"$@"
+}
+
 create_config()
 {
 	[[ -f wp-config.php ]] && unlink wp-config.php
@@ -157,35 +179,351 @@ setup_s3() {
 }
 
 setup_components() {
-	setup_database
-
-	# Update pre-installed components
-	wp core update --minor
-	wp plugin update --all
-	wp theme update --all
-	wp language core update
-	wp language plugin update --all
-	wp language theme update --all
+	# Changes to the database are made by one container at a time; components are
+	# installed locally by each container
+	with_db_lock ${SETUP_LOCK} setup_database
 
 	# Ensure at least one theme is installed
 	[[ ${#THEMES[*]} -eq 0 ]] && THEMES+=( ${DEFAULT_THEME} )
 
+	if is_baked; then
+		timestamp "Using components baked into the image, see ${BAKE_LOCK}"
+	else
+		with_package_cache install_components
+	fi
+
+	with_db_lock ${SETUP_LOCK} setup_state
+
+	setup_s3
+
+	return 0
+}
+
+setup_state()
+{
+	# Update the database for the installed components, unless another container with
+	# the same components has already done so
+	local digest
+	digest=$(
+		{ wp core version; wp plugin list --fields=name,version; wp theme list --fields=name,version; } |
+		sha256sum | cut -d' ' -f1
+	)
+	if [[ $(wp option get entrypoint_state 2>/dev/null) == "$digest" ]]; then
+		timestamp "Database already prepared for the installed components"
+		return 0
+	fi
+
+	wp core update-db
+
+	# Ensure a theme is active
+	[[ $(wp theme list --status=active --format=count) -eq 0 ]] &&
+		wp theme activate $(wp theme list --field=name | head -n1)
+
+	deactivate_missing_plugins
+
+	wp option update entrypoint_state "$digest" --autoload=no
+}
+
+with_db_lock()
+{
+	# Run a command while holding a MySQL advisory lock on the site's database, so that
+	# only one container at a time runs it.  The lock is held by a helper process; if the
+	# container exits early its database connection closes, releasing the lock.
+	#
+	# Bash unsets the DB_LOCK variables and closes its ends of the pipes once the helper
+	# exits, so the process ID is saved and the helper's output is read from a duplicate.
+	local name=$1 reply= pid input output
+	shift
+	coproc DB_LOCK {
+		DB_LOCK_CONFIG=$(wp config list DB_ --format=json) \
+		exec php /usr/local/lib/db-lock.php "$name" "${DB_LOCK_TIMEOUT:-600}"
+	}
+	pid=${DB_LOCK_PID} output=${DB_LOCK[1]}
+	exec {input}<&${DB_LOCK[0]}
+	timestamp "Waiting for the ${name} lock"
+	read -r reply <&${input} || true
+	exec {input}<&-
+	case $reply in
+		locked) ;;
+		timeout)
+			fatal "Timed out waiting for the ${name} lock"
+			return 1 ;;
+		"")
+			fatal "The ${name} lock helper exited without taking the lock"
+			return 1 ;;
+		*)
+			fatal "Failed to take the ${name} lock: ${reply}"
+			return 1 ;;
+	esac
+	"$@"
+	exec {output}>&-
+	wait ${pid}
+}
+
+install_components()
+{
+	# Update pre-installed components one container at a time, as updating core may also
+	# upgrade the database
+	with_db_lock ${SETUP_LOCK} update_components
+
 	# Install configured components
 	[[ ${#PLUGINS[*]} -gt 0 ]] && wp plugin install "${PLUGINS[@]}"
 	[[ ${#THEMES[*]} -gt 0 ]] && wp theme install "${THEMES[@]}"
 	[[ ${#LANGUAGES[*]} -gt 0 ]] && wp language core install "${LANGUAGES[@]}"
 	[[ ${#LANGUAGES[*]} -gt 0 ]] && wp language plugin install --all "${LANGUAGES[@]}"
 	[[ ${#LANGUAGES[*]} -gt 0 ]] && wp language theme install --all "${LANGUAGES[@]}"
+	return 0
+}
 
-	# Ensure a theme is active
-	[[ $(wp theme list --status=active --format=count) -eq 0 ]] &&
-		wp theme activate $(wp theme list --field=name | head -n1)
+update_components()
+{
+	wp core update --minor
+	wp plugin update --all
+	wp theme update --all
+	wp language core update
+	wp language plugin update --all
+	wp language theme update --all
+}
 
-	deactivate_missing_plugins
+with_package_cache()
+{
+	# Run a command with wp-cli's download cache in PACKAGE_CACHE, which may be shared by
+	# many containers.  The first container to arrive runs the command while the others
+	# wait, so that it alone downloads the packages missing from the cache; the others
+	# then run concurrently, finding the packages cached.  The command runs with a private
+	# copy of the cached packages, so the cache itself is only locked while copying:
+	# shared while copying packages out of it, exclusive while storing new packages.
+	[[ -v PACKAGE_CACHE ]] || { "$@"; return; }
+	mkdir -p "${PACKAGE_CACHE}"
+	(
+		work=$(mktemp -d)
+		trap 'rm -rf "$work"' EXIT
+		exec 8>"${PACKAGE_CACHE}/.install.lock"
+		if ! flock -n 8; then
+			timestamp "Waiting for another container to fill the package cache"
+			flock -s 8
+		fi
+		corrupt=$(
+			exec 9>"${PACKAGE_CACHE}/.lock"
+			flock -s 9 && fetch_package_cache "$work"
+		)
+		WP_CLI_CACHE_DIR=${work} "$@"
+		(
+			timestamp "Waiting for the package cache lock"
+			flock 9
+			verify_package_cache ${corrupt}
+			store_package_cache "$work"
+			evict_package_cache
+			record_package_cache
+		) 9>"${PACKAGE_CACHE}/.lock"
+	)
+}
 
-	setup_s3
+package_cache_patterns()
+{
+	# Output glob patterns matching the names wp-cli gives the cached packages of the
+	# configured components, and of the installed ones which may be updated
+	local item
+	for item in "${PLUGINS[@]}" $(wp plugin list --field=name); do
+		echo "./plugin/$(basename "${item%.zip}")-*"
+	done
+	for item in "${THEMES[@]}" $(wp theme list --field=name); do
+		echo "./theme/$(basename "${item%.zip}")-*"
+	done
+	for item in "${LANGUAGES[@]}" $(wp language core list --status=installed --field=language); do
+		echo "./translation/*${item}*"
+	done
+	echo "./core/*"
+}
 
-	return 0
+fetch_package_cache()
+{
+	# Copy the cached packages of the site's components which pass their checksums to
+	# a directory, and output the names of those which fail
+	local dest=$1 patterns name line
+	[[ -f ${PACKAGE_CACHE}/.sha256sums ]] || return 0
+	patterns=$(package_cache_patterns)
+	(
+		# The patterns are expanded to the names of matching packages in the cache
+		cd "${PACKAGE_CACHE}"
+		for name in ${patterns}; do
+			[[ ! -e $name ]] || echo "$name"
+		done |
+			awk 'FILENAME == ARGV[1] { used[$1]; next } $2 in used' - .sha256sums |
+			{ sha256sum -c 2>/dev/null || true; } |
+			while read -r line; do
+				case $line in
+					*": OK") cp --parents --reflink=auto -t "$dest" -- "${line%: OK}" ;;
+					*": FAILED"*) echo "${line%%: FAILED*}" ;;
+				esac
+			done
+	)
+}
+
+store_package_cache()
+{
+	# Copy packages from a directory to the cache, unless they are already cached
+	local name
+	(
+		cd "$1"
+		find . -type f |
+			while read -r name; do
+				[[ -e ${PACKAGE_CACHE}/${name} ]] ||
+					cp --parents --reflink=auto -- "$name" "${PACKAGE_CACHE}"
+			done
+	)
+}
+
+verify_package_cache()
+{
+	# Remove the named cached packages if they still fail their checksums, and any which
+	# have no checksum because their download was interrupted
+	(
+		cd "${PACKAGE_CACHE}"
+		touch .sha256sums
+		if [[ $# -gt 0 ]]; then
+			printf '%s\n' "$@" |
+				awk 'FILENAME == ARGV[1] { named[$1]; next } $2 in named' - .sha256sums |
+				{ sha256sum -c 2>/dev/null || true; } |
+				sed -n 's/: FAILED.*$//p' |
+				xargs -r rm -fv --
+		fi
+		find . -type f ! -name '.*' |
+			awk 'FILENAME == ARGV[1] { known[$2]; next } !($1 in known)' .sha256sums - |
+			xargs -r rm -fv --
+	)
+}
+
+evict_package_cache()
+{
+	# Remove packages older than PACKAGE_CACHE_AGE days, then the oldest packages until
+	# the total size is within PACKAGE_CACHE_SIZE
+	local max_size=${PACKAGE_CACHE_SIZE:-1G}
+	case ${max_size: -1} in
+		[Kk]) max_size=$(( ${max_size%?} << 10 )) ;;
+		[Mm]) max_size=$(( ${max_size%?} << 20 )) ;;
+		[Gg]) max_size=$(( ${max_size%?} << 30 )) ;;
+	esac
+	(
+		cd "${PACKAGE_CACHE}"
+		find . -type f ! -name '.*' -mtime +${PACKAGE_CACHE_AGE:-30} -exec rm -fv -- {} +
+		local total=0 mtime size name
+		find . -type f ! -name '.*' -exec stat -c '%Y %s %n' {} + |
+			sort -rn |
+			while read -r mtime size name; do
+				total=$(( total + size ))
+				if [[ $total -gt $max_size ]]; then
+					rm -fv -- "$name"
+				fi
+			done
+	)
+}
+
+record_package_cache()
+{
+	# Record the checksums of newly downloaded packages, and forget removed packages
+	(
+		cd "${PACKAGE_CACHE}"
+		touch .sha256sums
+		find . -type f ! -name '.*' | sort >.files
+		{
+			awk 'FILENAME == ARGV[1] { keep[$1]; next } $2 in keep' .files .sha256sums
+			awk 'FILENAME == ARGV[1] { known[$2]; next } !($1 in known)' .sha256sums .files |
+				xargs -r sha256sum
+		} >.sha256sums.new
+		mv .sha256sums.new .sha256sums
+		rm .files
+	)
+}
+
+components_digest()
+{
+	# Identify the configured set of components, to match against a lockfile
+	printf '%s\n' "${PLUGINS[@]}" -- "${THEMES[@]}" -- "${LANGUAGES[@]}" |
+		sha256sum | cut -d' ' -f1
+}
+
+is_baked()
+{
+	[[ -e ${BAKE_LOCK} ]] || return 1
+	local digest
+	read -r _ digest <"${BAKE_LOCK}"
+	[[ $digest == "$(components_digest)" ]] && return 0
+	timestamp "Configured components differ from those baked into the image; installing"
+	return 1
+}
+
+bake_components()
+{
+	# Install the configured components without a database, recording the installed
+	# versions and the checksums of their packages in a lockfile
+	[[ ${#THEMES[*]} -eq 0 ]] && THEMES+=( ${DEFAULT_THEME} )
+
+	local item lock=${BAKE_LOCK}.tmp
+	echo "# $(components_digest)" >"$lock"
+	for item in "${PLUGINS[@]}"; do
+		bake_package plugin "$item" >>"$lock"
+	done
+	for item in "${THEMES[@]}"; do
+		bake_package theme "$item" >>"$lock"
+	done
+	for item in "${LANGUAGES[@]}"; do
+		bake_translation core "" "$(wp core version)" "$item" >>"$lock"
+		while read -r type slug version _; do
+			bake_translation ${type}s "$slug" "$version" "$item"
+		done < <(grep -E '^(plugin|theme) ' "$lock") >>"$lock"
+	done
+	mv "$lock" "${BAKE_LOCK}"
+}
+
+bake_package()
+{
+	# Install a plugin or theme, by name from the wordpress.org registry or from a URL;
+	# output a lockfile line
+	local type=$1 slug=$2 version=- url info
+	if [[ $slug == *://* ]]; then
+		url=$slug
+		slug=$(basename "${url%.zip}")
+	else
+		info=$(
+			curl -fsS --get "${WP_ORG_API}/${type}s/info/1.2/" \
+				--data action=${type}_information \
+				--data "request[slug]=${slug}"
+		)
+		version=$(jq -r .version <<<"$info")
+		url=$(jq -r .download_link <<<"$info")
+	fi
+	timestamp >&2 "Baking ${type} ${slug} ${version}"
+	echo "${type} ${slug} ${version} $(fetch_package "$url" wp-content/${type}s)"
+}
+
+bake_translation()
+{
+	# Install a translation for core or a plugin or theme, if one exists; output
+	# a lockfile line
+	local type=$1 slug=$2 version=$3 language=$4 dest=wp-content/languages url
+	[[ $version == - ]] && return
+	[[ $type != core ]] && dest+=/$type
+	url=$(
+		curl -fsS --get "${WP_ORG_API}/translations/${type}/1.0/" \
+			--data version="${version}" \
+			${slug:+--data slug="${slug}"} |
+		jq -r --arg lang "$language" '.translations[] | select(.language == $lang) | .package'
+	)
+	[[ -n $url ]] || return 0
+	timestamp >&2 "Baking ${language} translation for ${slug:-core} ${version}"
+	echo "language ${type}/${slug:-core}/${language} ${version} $(fetch_package "$url" "$dest")"
+}
+
+fetch_package()
+{
+	# Download and unpack a .zip package into a directory, outputting its checksum
+	local url=$1 dest=$2 package=$(mktemp)
+	curl -fsSL -o "$package" "$url"
+	mkdir -p "$dest"
+	unzip -qo "$package" -d "$dest"
+	sha256sum "$package" | cut -d' ' -f1
+	rm "$package"
 }
 
 get_writable_dirs()
@@ -213,20 +551,106 @@ setup_sandbox()
 	wp config set WPMU_PLUGIN_DIR /app/wp-content/mu-plugins
 	rm -r static/wp/wp-content
 	ln -s ../wp-content static/wp/wp-content
-	rsync \
-		--archive \
-		--exclude=/wp-content/mu-plugins/ \
-		wp-content static/
 	mkdir -p \
+		static/wp-content/languages \
 		static/wp-content/plugins \
+		static/wp-content/themes \
 		static/wp-content/upgrade
-	chown -R www-data:www-data \
+	sync_sandbox
+	chown www-data:www-data \
 		static/wp-content/languages \
 		static/wp-content/plugins \
 		static/wp-content/themes \
 		static/wp-content/upgrade
 }
 
+sync_sandbox()
+{
+	# Copy each extension (plugin, theme, etc.) into the static volume, skipping those
+	# unchanged since the last start according to a manifest of their files' metadata.
+	# Only copied extensions have their ownership changed.
+	local manifest=static/wp-content/.sandbox-manifest tree digest
+	local -A previous=() current=()
+	local -i copied=0
+
+	if [[ -e ${manifest} ]]; then
+		while read -r digest tree; do
+			previous[$tree]=$digest
+		done <${manifest}
+	fi
+
+	for tree in wp-content/!(mu-plugins|plugins|themes) wp-content/{plugins,themes}/*; do
+		digest=$(find "$tree" -exec stat -c '%n %s %Y' {} + | sha256sum | cut -d' ' -f1)
+		current[$tree]=$digest
+		[[ ${previous[$tree]-} == "$digest" && -e static/$tree ]] && continue
+
+		if [[ $tree == wp-content/@(languages|plugins|themes|upgrade)* ]]; then
+			copy_tree "$tree" "static/$tree" ${WORKER_USER}:${WORKER_USER}
+		else
+			copy_tree "$tree" "static/$tree"
+		fi
+		copied+=1
+	done
+
+	for tree in "${!current[@]}"; do
+		echo "${current[$tree]} $tree"
+	done >${manifest}
+	timestamp "Copied ${copied} changed extensions of ${#current[*]} into the sandbox"
+}
+
+copy_tree()
+{
+	# Replace a copy of a file tree, optionally owned by a new owner.  Hard links share
+	# their owner and contents with the source files, so only trees keeping their owner
+	# (and so read-only to the worker user) are hard links, if the source and destination
+	# are on the same filesystem; otherwise the tree is copied, using reflinks where the
+	# filesystem supports them.
+	local src=$1 dest=$2 owner=${3-}
+	rm -rf "$dest"
+	if [[ -z $owner && $(stat -c %d "$src") == $(stat -c %d "${dest%/*}") ]]; then
+		cp --archive --link "$src" "$dest"
+	else
+		cp --archive --reflink=auto "$src" "$dest"
+	fi
+	[[ -z $owner ]] || chown -R "$owner" "$dest"
+}
+
+setup_images()
+{
+	# Limit the threads ImageMagick (through OpenMP) starts in each process to the CPUs
+	# available to the container, instead of one per core of the host.  The limits are
+	# read by ImageMagick when PHP-FPM's master process loads the Imagick extension, and
+	# so apply to every worker.
+	local threads=${IMAGE_THREADS:-$(cpu_quota)}
+	export MAGICK_THREAD_LIMIT=${threads} OMP_NUM_THREADS=${threads} OMP_THREAD_LIMIT=${threads}
+	timestamp "Limiting image processing to ${threads} threads per process"
+
+	local defer=false
+	case ${IMAGE_DEFER_SIZES-} in
+		''|false|n|no|off|0) ;;
+		*) defer=true ;;
+	esac
+	wp config set IMAGE_DEFER_SIZES ${defer} --raw
+}
+
+cpu_quota()
+{
+	# Print the number of whole CPUs the container may use, and at least one
+	local quota period
+	local -i cpus=$(nproc)
+
+	if [[ -r /sys/fs/cgroup/cpu.max ]]; then
+		read quota period </sys/fs/cgroup/cpu.max
+	elif [[ -r /sys/fs/cgroup/cpu/cpu.cfs_quota_us ]]; then
+		read quota </sys/fs/cgroup/cpu/cpu.cfs_quota_us
+		read period </sys/fs/cgroup/cpu/cpu.cfs_period_us
+	fi
+	if [[ ${quota:-max} != max ]] && (( quota > 0 && quota / period < cpus )); then
+		cpus=$(( quota / period ))
+	fi
+	echo $(( cpus > 0 ? cpus : 1 ))
+}
+
 setup_debug()
 {
 	local IFS=', ' feature
@@ -263,6 +687,7 @@ collect_static()
 		--exclude="${MEDIA}" \
 		--exclude="${CACHE}" \
 		--exclude=/static/ \
+		--exclude=/_prerendered/ \
 		--exclude=/vendor/ \
 		--force \
 		--info="${flags[*]}" \
@@ -278,6 +703,104 @@ generate_static()
 {
 	mkdir -p static/errors
 	wp eval 'get_template_part("404");' >static/errors/404.html
+	prerender_pages
+}
+
+prerender_pages()
+{
+	# Render the pages listed in PRERENDER into the static directory, from which they are
+	# served to anonymous visitors by the frontend, see data/nginx/server.conf
+	local -A rendered=()
+	local -a urls
+	local -i failed=0
+	local generation home item url file
+
+	if [[ ${#PRERENDER[*]} -eq 0 ]]; then
+		rm -rf ${PRERENDER_DIR}
+		return 0
+	fi
+
+	generation=$(wp option get prerender_generation 2>/dev/null || echo 0)
+	home=$(wp option get home)
+	mkdir -p ${PRERENDER_DIR}
+
+	readarray -t urls < <(
+		for item in "${PRERENDER[@]}"; do
+			case $item in
+				/*) echo "${home%/}${item}" ;;
+				*) wp post list --post_type="$item" --post_status=publish --field=url \
+					--posts_per_page=${PRERENDER_LIMIT:-100} --orderby=modified ;;
+			esac
+		done
+	)
+	# The reasons pages fail to render are written to stderr by prerender.php
+	for url in "${urls[@]}"; do
+		php /usr/local/lib/prerender.php "$url" ${PRERENDER_DIR} || failed+=1
+	done >${PRERENDER_DIR}/.rendered
+
+	# Remove pages which are no longer listed or no longer render
+	while read -r file; do
+		rendered[$file]=1
+	done <${PRERENDER_DIR}/.rendered
+	for file in ${PRERENDER_DIR}/**/*.{html,rss,atom}; do
+		[[ -v rendered[$file] ]] || rm -f "$file"
+	done
+	find ${PRERENDER_DIR} -mindepth 1 -type d -empty -delete
+
+	echo "$generation" >${PRERENDER_DIR}/.generation
+	timestamp "Pre-rendered ${#rendered[*]} pages, ${failed} failed"
+}
+
+run_prerender()
+{
+	enable -f /usr/lib/bash/sleep sleep
+	shopt -s nullglob globstar
+
+	# Re-render pages when the content of the site changes (see plugins/prerender.php), or
+	# when they reach PRERENDER_INTERVAL seconds old
+	local rendered current
+	local -i expires=$(( SECONDS + ${PRERENDER_INTERVAL:-3600} ))
+
+	while sleep 30; do
+		read -r rendered <${PRERENDER_DIR}/.generation || rendered=
+		current=$(wp option get prerender_generation 2>/dev/null || echo 0)
+		[[ $current == "$rendered" ]] && (( SECONDS < expires )) && continue
+		prerender_pages
+		expires=$(( SECONDS + ${PRERENDER_INTERVAL:-3600} ))
+	done
+}
+
+run_background_prerender()
+{
+	# Arrays cannot be exported, and settings from configuration files are not exported,
+	# so the settings are passed to the new shell as declarations
+	[[ ${#PRERENDER[*]} -gt 0 ]] || return 0
+	(
+		export -f prerender_pages run_prerender timestamp
+		exec -a wp-prerender /bin/bash <<<"
+			$(declare -p PRERENDER ${!PRERENDER_@})
+			run_prerender
+		"
+	)&
+}
+
+compact_autoload()
+{
+	local -a args=()
+	local item
+
+	for item in "${AUTOLOAD_COMPACT[@]}"; do
+		case $item in
+			orphaned) args+=( --orphaned ) ;;
+			transients) args+=( --transients ) ;;
+			*) args+=( "$item" ) ;;
+		esac
+	done
+
+	[[ ${#args[*]} -gt 0 ]] &&
+		with_db_lock ${SETUP_LOCK} wp autoload compact "${args[@]}"
+
+	wp autoload check --budget="${AUTOLOAD_BUDGET:-800K}"
 }
 
 deactivate_missing_plugins()
@@ -311,18 +834,83 @@ run_cron()
 {
 	enable -f /usr/lib/bash/sleep sleep
 	enable -f /usr/lib/bash/head head
-	while wp cron event run --due-now || true; do
-		sleep $(next_cron)
-		timestamp "Executing cron tasks"
+
+	# Only one replica at a time runs due events: the one holding the cron lease, which
+	# it renews every third of the lease's lifetime.  Other replicas check as often, so
+	# if the holder dies another takes over once the lease expires.
+	local holder=${HOSTNAME} ttl=${CRON_LEASE_TTL:-60}
+	local lease current= delay
+
+	# Renewing every third of a shorter lifetime would mean renewing continuously
+	if (( ttl < 3 )); then
+		timestamp "WARNING: CRON_LEASE_TTL is less than 3 seconds, using 3 seconds"
+		ttl=3
+	fi
+
+	# On SIGTERM, or SIGQUIT (the image's stop signal, for the run-cron command), finish
+	# any running tasks, then exit; the sleep is waited on in the background so that it
+	# can be interrupted
+	echo $BASHPID >${CRON_PIDFILE}
+	trap 'kill $! 2>/dev/null; wp cron-lease release "${holder}";
+		rm -f ${CRON_PIDFILE}; timestamp "Stopped cron tasks"; exit' TERM QUIT
+
+	while true; do
+		if lease=$(wp cron-lease acquire "${holder}" --ttl=${ttl}); then
+			log_cron_lease
+			timestamp "Executing cron tasks"
+			renew_cron_lease & wp cron event run --due-now || true
+			kill $! 2>/dev/null
+		else
+			log_cron_lease
+		fi
+		delay=$(next_cron)
+		(( delay > ttl / 3 )) && delay=$(( ttl / 3 ))
+		(( delay < 1 )) && delay=1
+		sleep ${delay} & wait $!
+	done
+}
+
+log_cron_lease()
+{
+	# Log the holder and expiry of the cron lease, when the holder changes
+	[[ ${lease%% *} == "${current}" ]] && return
+	current=${lease%% *}
+	timestamp "Cron lease held by ${current} until $(date --utc -d @${lease##* } +'%Y-%m-%dT%H:%M:%S%z')"
+}
+
+renew_cron_lease()
+{
+	# Renew the cron lease while events are running
+	trap - TERM QUIT
+	while sleep $(( ttl / 3 )); do
+		wp cron-lease acquire "${holder}" --ttl=${ttl} >/dev/null ||
+			timestamp "WARNING: lost the cron lease while executing cron tasks"
 	done
 }
 
 run_background_cron()
 { (
-	export -f next_cron run_cron timestamp
+	export -f next_cron run_cron log_cron_lease renew_cron_lease timestamp
 	exec -a wp-cron /bin/bash <<<run_cron
 )& }
 
+stop_cron()
+{
+	local pid
+	[[ -e ${CRON_PIDFILE} ]] || return 0
+	read pid <${CRON_PIDFILE}
+	if ! kill -TERM $pid 2>/dev/null; then
+		rm -f ${CRON_PIDFILE}
+		return 0
+	fi
+	timestamp "Waiting for cron tasks to finish"
+	# The runner removes the file as it exits, unless it is killed first
+	while [[ -e ${CRON_PIDFILE} ]] && kill -0 $pid 2>/dev/null; do
+		sleep 1
+	done
+	rm -f ${CRON_PIDFILE}
+}
+
 readlines()
 {
 	declare -n ARRAY=$1
@@ -361,17 +949,34 @@ done
 cd ${WORK_DIR}
 case "$1" in
 	collect-static) create_config && setup_components && collect_static ;;
-	run-cron) create_config && run_cron ;;
+	bake)
+		# Run in a child image's Dockerfile; no database is needed, so placeholder
+		# connection details are used for the duration
+		: ${DB_NAME:=bake} ${DB_USER:=bake} ${SITE_URL:=http://bake.invalid}
+		create_config && bake_components && collect_static
+		unlink wp-config.php
+		;;
+	run-cron) create_config && setup_images && run_cron ;;
+	drain)
+		# Run before stopping the container (e.g. as a Kubernetes preStop hook) to stop
+		# cron tasks and give the frontend time to stop sending requests
+		timestamp "Draining"
+		stop_cron & sleep ${FPM_SHUTDOWN_DELAY:-15}
+		wait
+		;;
 	php-fpm)
 		timestamp "Starting Wordpress preparation"
-		create_config
-		setup_debug
-		setup_components
-		collect_static
-		generate_static
-		setup_sandbox
+		stage create_config
+		stage setup_debug
+		stage setup_images
+		stage setup_components
+		stage compact_autoload
+		stage collect_static
+		stage generate_static
+		stage setup_sandbox
 		timestamp "Completed Wordpress preparation"
 		run_background_cron
+		run_background_prerender
 		exec "$@" "${extra_args[@]}"
 		;;
 	*)
@@ -5,6 +5,7 @@ set -eux
 apk update
 apk add \
 	bash \
+	coreutils \
 	imagemagick-libs \
 	jq \
 	libgmpxx \
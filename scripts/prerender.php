@@ -0,0 +1,90 @@
+<?php
+/**
+ * Copyright 2026 Dominik Sekotill <dom.sekotill@kodo.org.uk>
+ *
+ * This Source Code Form is subject to the terms of the Mozilla Public
+ * License, v. 2.0. If a copy of the MPL was not distributed with this
+ * file, You can obtain one at http://mozilla.org/MPL/2.0/.
+ *
+ * Render a page of the site as an anonymous visitor, and store it as a static file
+ *
+ * Usage: php prerender.php <url> <directory>
+ *
+ * The page is rendered by loading Wordpress as if handling a GET request for the URL, with
+ * no cookies.  Pages are stored in the directory at the URL's path with an ".html" suffix,
+ * or for feeds ".rss" or ".atom", so that they are served with the right content type;
+ * paths ending with "/" are stored as "index.html" (etc.) in the directory at that path.
+ * URLs with a query string are not supported.  The stored file's path is written to
+ * standard output.
+ *
+ * Pages which do not render with a 200 status (such as redirects and missing pages) are not
+ * stored, and the process exits with a non-zero status.
+ */
+
+list( , $url, $directory ) = $argv;
+
+$parts = parse_url( $url );
+$parts['path'] = $parts['path'] ?? '/';
+if ( isset( $parts['query'] ) ) {
+	fwrite( STDERR, "Cannot pre-render {$url}: query strings are not supported\n" );
+	exit( 1 );
+}
+
+$_SERVER = array_merge( $_SERVER, array(
+	'REQUEST_METHOD' => 'GET',
+	'REQUEST_URI' => $parts['path'],
+	'SCRIPT_NAME' => '/index.php',
+	'PHP_SELF' => '/index.php',
+	'HTTP_HOST' => $parts['host'] . ( isset( $parts['port'] ) ? ":{$parts['port']}" : '' ),
+	'SERVER_NAME' => $parts['host'],
+	'SERVER_PORT' => $parts['port'] ?? ( $parts['scheme'] == 'https' ? 443 : 80 ),
+	'HTTPS' => $parts['scheme'] == 'https' ? 'on' : 'off',
+	'REMOTE_ADDR' => '127.0.0.1',
+) );
+$_GET = $_POST = $_COOKIE = $_REQUEST = array();
+
+// Record the response status, with a hook added before Wordpress is loaded
+$prerender_status = 200;
+$GLOBALS['wp_filter']['status_header'][10][] = array(
+	'function' => function( $header, $code ) {
+		global $prerender_status;
+		$prerender_status = $code;
+		return $header;
+	},
+	'accepted_args' => 2,
+);
+
+register_shutdown_function( function() use ( $url, $directory, $parts ) {
+	global $prerender_status;
+	$content = ob_get_clean();
+
+	if ( $prerender_status != 200 || $content === '' ) {
+		fwrite( STDERR, "Cannot pre-render {$url}: response status {$prerender_status}\n" );
+		exit( 1 );
+	}
+
+	$extension = 'html';
+	if ( function_exists( 'is_feed' ) && is_feed() ) {
+		$extension = in_array( get_query_var( 'feed' ), array( 'atom', 'rss' ) )
+			? get_query_var( 'feed' ) : 'rss';
+	}
+
+	$path = rtrim( $directory, '/' ) . rawurldecode( $parts['path'] );
+	if ( substr( $path, -1 ) == '/' ) {
+		$path .= 'index';
+	}
+	$path .= ".{$extension}";
+	$dir = dirname( $path );
+	if ( !is_dir( $dir ) ) {
+		mkdir( $dir, 0755, true );
+	}
+	file_put_contents( "{$path}.tmp", $content );
+	chmod( "{$path}.tmp", 0644 );
+	rename( "{$path}.tmp", $path );
+	echo "{$path}\n";
+} );
+
+ob_start();
+define( 'WP_USE_THEMES', true );
+chdir( getenv( 'WORDPRESS_ROOT' ) ?: '/app' );
+require './wp-blog-header.php';
@@ -0,0 +1,26 @@
+Feature: Autoloaded options management
+	The "wp autoload" command reports the size of options loaded on every
+	request, and can stop options from being autoloaded.
+
+	Scenario: Autoloaded options can be reported as JSON
+		When "wp autoload report --format=json --limit=5" is run
+		Then JSON is seen from stdout
+		And nothing is seen from stderr
+
+	Scenario: No warning is issued when the budget is not exceeded
+		When "wp autoload check --budget=1G" is run
+		Then nothing is seen from stdout
+		And nothing is seen from stderr
+
+	Scenario: Options matching a pattern are no longer autoloaded
+		When "wp option add test_bloat_option spam --autoload=yes" is run
+		And "wp autoload compact test_bloat_*" is run
+		Then "Disabling autoload: test_bloat_option (4 bytes)" is seen from stdout
+		And nothing is seen from stderr
+
+	Scenario: A dry run reports the options which would no longer be autoloaded
+		When "wp option add test_dry_option spam --autoload=yes" is run
+		And "wp autoload compact test_dry_* --dry-run" is run
+		Then "Would disable autoload: test_dry_option (4 bytes)" is seen from stdout
+		When "wp autoload compact test_dry_*" is run
+		Then "Disabling autoload: test_dry_option (4 bytes)" is seen from stdout
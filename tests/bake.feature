@@ -0,0 +1,19 @@
+@long-running
+
+Feature: Baked images
+	Components baked into a child image with the "bake" command are used at
+	startup without downloading anything from wordpress.org.
+
+	Background:
+		Given the site is not running
+
+	Scenario: A baked image starts without access to wordpress.org
+		Given the backend image is baked with bake.conf
+		And the backend cannot reach wordpress.org
+		When the site is started
+		Then the backend log contains:
+			"""
+			Using components baked into the image
+			"""
+		And the plugin wp-dummy-content-generator is installed
+		And the language fr_FR is installed
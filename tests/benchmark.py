@@ -0,0 +1,471 @@
+#  Copyright 2026  Dominik Sekotill <dom.sekotill@kodo.org.uk>
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Performance benchmarks for site fixtures
+
+Two benchmarks are available, both of which use the same fixtures as the behaviour tests:
+
+"http" seeds a site with generated content, then requests it from concurrent clients, and
+reports the throughput and latency percentiles for each group of URLs.
+
+"startup" starts backend containers under a range of conditions, and reports the time
+taken by each phase of the entrypoint, taken from the container logs.
+
+Reports are JSON documents, and may be compared against a previous report used as
+a baseline.  Run from the top directory of the project:
+
+	python tests/benchmark.py http --output=report.json
+	python tests/benchmark.py startup --baseline=report.json --threshold=10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+from collections.abc import Collection
+from collections.abc import Iterator
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from datetime import timezone
+from itertools import cycle
+from itertools import islice
+from math import ceil
+from os import fsdecode
+from pathlib import Path
+from secrets import token_hex
+from statistics import mean
+from threading import Lock
+from time import perf_counter
+from typing import Any
+
+from behave_utils import URL
+from behave_utils import JSONArray
+from behave_utils.docker import Network
+from behave_utils.docker import docker_output
+from behave_utils.docker import docker_quiet
+from behave_utils.docker import inspect
+from behave_utils.mysql import Mysql
+from pooling import pooled_redirect
+from requests import Session
+from requests.exceptions import RequestException
+from wp import DEFAULT_URL
+from wp import Site
+from wp import Wordpress
+
+STATIC_ASSETS = [
+	URL("/wp-includes/js/jquery/jquery.min.js"),
+	URL("/wp-includes/css/dist/block-library/style.min.css"),
+	URL("/wp-includes/images/w-logo-blue.png"),
+]
+
+# Commonly installed plugins from the wordpress.org registry, for startup benchmarks
+PLUGINS = [
+	"advanced-custom-fields", "akismet", "all-in-one-wp-migration", "autoptimize",
+	"classic-editor", "contact-form-7", "cookie-notice", "custom-post-type-ui",
+	"disable-comments", "duplicate-post", "ewww-image-optimizer", "health-check",
+	"limit-login-attempts-reloaded", "loco-translate", "query-monitor", "really-simple-ssl",
+	"redirection", "regenerate-thumbnails", "safe-svg", "simple-custom-post-order",
+	"svg-support", "tinymce-advanced", "updraftplus", "user-role-editor",
+	"widget-importer-exporter", "wordpress-importer", "wp-dummy-content-generator",
+	"wp-mail-smtp", "wp-optimize", "wp-super-cache",
+]
+
+STATIC_PATH = Path("/app/static")
+STAGE_MARKER = "] Stage: "
+READY_MARKER = "] Completed Wordpress preparation"
+
+logger = logging.getLogger("benchmark")
+
+
+@dataclass
+class Stats:
+	"""
+	Summary statistics of a load run against a group of URLs
+
+	Latencies are in milliseconds.
+	"""
+
+	requests: int
+	errors: int
+	throughput: float
+	p50: float
+	p95: float
+	p99: float
+
+	@classmethod
+	def from_samples(cls, latencies: Sequence[float], errors: int, elapsed: float) -> Stats:
+		"""
+		Create an instance from a list of latencies (in seconds) and the time taken
+		"""
+		ordered = sorted(latencies)
+		return cls(
+			requests=len(ordered) + errors,
+			errors=errors,
+			throughput=round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+			p50=round(percentile(ordered, 50) * 1000, 2),
+			p95=round(percentile(ordered, 95) * 1000, 2),
+			p99=round(percentile(ordered, 99) * 1000, 2),
+		)
+
+
+@dataclass
+class StartupCase:
+	"""
+	Conditions under which a backend container is started for a startup benchmark
+
+	"installed" selects whether the database has already been installed to by a previous
+	container; "static" whether the static volume is already populated, which implies
+	"installed".
+	"""
+
+	installed: bool = False
+	static: bool = False
+	plugins: int = 0
+	languages: Sequence[str] = field(default_factory=list)
+
+	def get_env(self) -> dict[str, str]:
+		"""
+		Return environment variables for the configured plugins and languages
+		"""
+		return dict(
+			PLUGINS=" ".join(PLUGINS[:self.plugins]),
+			LANGUAGES=" ".join(self.languages),
+		)
+
+
+STARTUP_CASES = {
+	"empty": StartupCase(),
+	"installed": StartupCase(installed=True),
+	"installed-static": StartupCase(installed=True, static=True),
+	"plugins-10": StartupCase(installed=True, plugins=10),
+	"plugins-30": StartupCase(installed=True, plugins=30),
+	"languages-1": StartupCase(installed=True, languages=["de_DE"]),
+	"languages-3": StartupCase(installed=True, languages=["de_DE", "fr_FR", "es_ES"]),
+}
+
+
+class LoadClient:
+	"""
+	Make concurrent requests to a running site fixture and record response latencies
+
+	Every worker thread uses its own `requests.Session`, with a single keep-alive
+	connection.
+	"""
+
+	def __init__(self, site: Site, concurrency: int):
+		self.site = site
+		self.concurrency = concurrency
+		self.address = site.address
+
+	@contextmanager
+	def session(self) -> Iterator[Session]:
+		"""
+		Return a context which provides a session directed at the site fixture
+		"""
+		with Session() as session:
+			pooled_redirect(session, self.site.url, self.address)
+			yield session
+
+	def run(self, urls: Sequence[URL], count: int) -> Stats:
+		"""
+		Request "count" URLs, cycling through "urls", and return the statistics of the run
+
+		Responses with a status code of 400 or above, and failed connections, are counted as
+		errors.
+		"""
+		latencies = list[float]()
+		errors = 0
+		lock = Lock()
+		# The first workers make one extra request each, to make up exactly "count"
+		share, remainder = divmod(count, self.concurrency)
+
+		def worker(offset: int) -> None:
+			nonlocal errors
+			quota = share + (1 if offset < remainder else 0)
+			targets = islice(cycle(urls), offset, offset + quota)
+			with self.session() as session:
+				for url in targets:
+					start = perf_counter()
+					try:
+						resp = session.get(self.site.url / url, allow_redirects=False)
+					except RequestException:
+						ok = False
+					else:
+						ok = resp.status_code < 400
+					latency = perf_counter() - start
+					with lock:
+						if ok:
+							latencies.append(latency)
+						else:
+							errors += 1
+
+		start = perf_counter()
+		with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+			for future in [executor.submit(worker, n) for n in range(self.concurrency)]:
+				future.result()
+		return Stats.from_samples(latencies, errors, perf_counter() - start)
+
+
+def percentile(ordered: Sequence[float], pct: float) -> float:
+	"""
+	Return the nearest-rank percentile of a sorted sequence of values
+	"""
+	if not ordered:
+		return 0.0
+	rank = ceil(pct / 100 * len(ordered))
+	return ordered[max(rank, 1) - 1]
+
+
+def seed_site(site: Site, posts: int, terms: int, comments: int) -> None:
+	"""
+	Generate content in a site fixture's database with WP-CLI
+	"""
+	wp = site.backend.cli
+	logger.info("Seeding %d posts, %d categories and %d comments", posts, terms, comments)
+	wp("term", "generate", "category", f"--count={terms}")
+	wp("post", "generate", f"--count={posts}", "--post_status=publish")
+	wp("comment", "generate", f"--count={comments}")
+
+
+def get_targets(site: Site, sample: int) -> dict[str, list[URL]]:
+	"""
+	Return groups of URLs to request, keyed by name
+	"""
+	wp = site.backend.cli
+	posts = wp(
+		"post", "list", "--field=url", "--format=json", f"--posts_per_page={sample}",
+		deserialiser=JSONArray.from_string,
+	)
+	archives = wp(
+		"term", "list", "category", "--field=url", "--format=json", "--hide_empty=1",
+		deserialiser=JSONArray.from_string,
+	)
+	return {
+		"homepage": [URL("/")],
+		"posts": [URL(str(url)) for url in posts],
+		"archives": [URL(str(url)) for url in archives[:sample]],
+		"search": [URL(f"/?s={term}") for term in ("lorem", "ipsum", "dolor", "amet")],
+		"rest": [URL("/wp-json/wp/v2/posts"), URL("/wp-json/wp/v2/categories")],
+		"static": STATIC_ASSETS,
+	}
+
+
+def time_startup(backend: Wordpress) -> dict[str, float]:
+	"""
+	Start a backend container and return the durations of its entrypoint's phases
+
+	Durations are in seconds, calculated from the timestamps Docker adds to log lines.  The
+	"total" item is the time from the container starting to the entrypoint completing.
+	"""
+	with backend.started():
+		logs = docker_output("logs", "--timestamps", backend.get_id())
+		started = parse_timestamp(inspect(backend).path("$.State.StartedAt", str))
+
+	durations = dict[str, float]()
+	phase, since = "start", started
+	for line in logs.splitlines():
+		stamp, _, message = line.partition(" ")
+		if STAGE_MARKER in message:
+			now = parse_timestamp(stamp)
+			durations[phase] = now - since
+			phase, since = message.partition(STAGE_MARKER)[2].strip(), now
+		elif READY_MARKER in message:
+			now = parse_timestamp(stamp)
+			durations[phase] = now - since
+			durations["total"] = now - started
+			return durations
+	raise ValueError("Completion message not found in the container logs")
+
+
+def run_startup_case(case: StartupCase, runs: int) -> dict[str, float]:
+	"""
+	Time a backend container starting "runs" times under the given conditions
+
+	Returns the mean durations of each phase, as returned by `time_startup`.
+	"""
+	samples = list[dict[str, float]]()
+	for _ in range(runs):
+		volume = f"benchmark-static-{token_hex(6)}"
+		timed_volume = volume if case.static else f"{volume}-empty"
+		try:
+			with Network() as network, Mysql(network=network) as database:
+				# A container is started beforehand to install the database and populate
+				# the static volume
+				if case.installed or case.static:
+					with make_startup_backend(case, database, network, volume) as backend:
+						with backend.started():
+							pass
+				with make_startup_backend(case, database, network, timed_volume) as backend:
+					samples.append(time_startup(backend))
+		finally:
+			docker_quiet("volume", "rm", "--force", volume, timed_volume)
+	return {key: round(mean(s[key] for s in samples if key in s), 3) for key in samples[0]}
+
+
+def make_startup_backend(
+	case: StartupCase,
+	database: Mysql,
+	network: Network,
+	static_volume: str,
+) -> Wordpress:
+	"""
+	Return a backend container configured for a startup case, with the named static volume
+	"""
+	backend = Wordpress(DEFAULT_URL, database, network=network)
+	backend.env.update(case.get_env())
+	backend.volumes = [
+		(static_volume, STATIC_PATH)
+		if isinstance(mount, tuple) and Path(fsdecode(mount[1])) == STATIC_PATH else
+		mount
+		for mount in backend.volumes
+	]
+	return backend
+
+
+def parse_timestamp(stamp: str) -> float:
+	"""
+	Return a POSIX timestamp from a Docker RFC-3339 timestamp with nanosecond precision
+	"""
+	whole, _, fraction = stamp.rstrip("Z").partition(".")
+	base = datetime.fromisoformat(whole).replace(tzinfo=timezone.utc)
+	return base.timestamp() + float(f"0.{fraction or 0}")
+
+
+def compare(
+	results: dict[str, dict[str, Any]],
+	baseline: dict[str, dict[str, Any]],
+	threshold: float,
+	lower_is_worse: Collection[str] = (),
+	higher_is_worse: Collection[str] = (),
+) -> list[str]:
+	"""
+	Return descriptions of regressions of more than "threshold" percent from a baseline
+
+	The names of metrics in each result which regress when they fall or rise are given by
+	"lower_is_worse" and "higher_is_worse" respectively.
+	"""
+	regressions = []
+	factor = threshold / 100
+	for name, stats in results.items():
+		if name not in baseline:
+			continue
+		base = baseline[name]
+		for metric in lower_is_worse:
+			if stats[metric] < base[metric] * (1 - factor):
+				regressions.append(f"{name}: {metric} {stats[metric]} < {base[metric]}")
+		for metric in higher_is_worse:
+			if stats[metric] > base[metric] * (1 + factor):
+				regressions.append(f"{name}: {metric} {stats[metric]} > {base[metric]}")
+	return regressions
+
+
+def benchmark_http(args: argparse.Namespace) -> list[str]:
+	"""
+	Run the HTTP load benchmark, write a report and return any regressions
+	"""
+	results = dict[str, dict[str, Any]]()
+	with Site.build(DEFAULT_URL) as site, site.running():
+		seed_site(site, args.posts, args.terms, args.comments)
+		client = LoadClient(site, args.concurrency)
+		for name, urls in get_targets(site, sample=50).items():
+			logger.info("Benchmarking %s (%d URLs)", name, len(urls))
+			client.run(urls, args.warmup)
+			results[name] = asdict(client.run(urls, args.requests))
+	return report(
+		args, results,
+		lower_is_worse=["throughput"],
+		higher_is_worse=["p95"],
+	)
+
+
+def benchmark_startup(args: argparse.Namespace) -> list[str]:
+	"""
+	Run the container startup benchmark, write a report and return any regressions
+	"""
+	results = dict[str, dict[str, Any]]()
+	for name in args.cases or STARTUP_CASES:
+		logger.info("Benchmarking startup: %s", name)
+		results[name] = run_startup_case(STARTUP_CASES[name], args.runs)
+	return report(args, results, higher_is_worse=["total"])
+
+
+def report(
+	args: argparse.Namespace,
+	results: dict[str, dict[str, Any]],
+	**metrics: Collection[str],
+) -> list[str]:
+	"""
+	Write results as JSON to the output file or stdout, and compare them with any baseline
+	"""
+	document = json.dumps(results, indent=2)
+	if args.output:
+		args.output.write_text(document + "\n")
+	else:
+		sys.stdout.write(document + "\n")
+
+	if not args.baseline:
+		return []
+	return compare(results, json.loads(args.baseline.read_text()), args.threshold, **metrics)
+
+
+def main(argv: Sequence[str]|None = None) -> int:
+	"""
+	Run a benchmark and report results; return an exit code for a CLI
+	"""
+	# Reporting options are accepted after the benchmark's name
+	common = argparse.ArgumentParser(add_help=False)
+	common.add_argument("--output", type=Path, help="write the report to a file")
+	common.add_argument("--baseline", type=Path, help="a previous report to compare with")
+	common.add_argument(
+		"--threshold", type=float, default=10.0,
+		help="percentage change from the baseline considered a regression",
+	)
+
+	parser = argparse.ArgumentParser(description="Performance benchmarks for site fixtures")
+	commands = parser.add_subparsers(required=True)
+
+	http = commands.add_parser(
+		"http", parents=[common], help="measure throughput and latency under load",
+	)
+	http.set_defaults(benchmark=benchmark_http)
+	http.add_argument("--concurrency", type=int, default=10)
+	http.add_argument("--requests", type=int, default=500, help="per group of URLs")
+	http.add_argument("--posts", type=int, default=1000)
+	http.add_argument("--terms", type=int, default=20)
+	http.add_argument("--comments", type=int, default=2000)
+	http.add_argument("--warmup", type=int, default=50, help="requests per group")
+
+	startup = commands.add_parser(
+		"startup", parents=[common], help="measure backend container startup times",
+	)
+	startup.set_defaults(benchmark=benchmark_startup)
+	startup.add_argument("--runs", type=int, default=3, help="runs to average per case")
+	startup.add_argument(
+		"cases", nargs="*", metavar="CASE",
+		help=f"cases to run (default: all of {', '.join(STARTUP_CASES)})",
+	)
+
+	args = parser.parse_args(argv)
+	if unknown := set(getattr(args, "cases", [])) - set(STARTUP_CASES):
+		parser.error(f"unknown startup cases: {', '.join(sorted(unknown))}")
+	logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+	regressions = args.benchmark(args)
+	for regression in regressions:
+		logger.error("Regression: %s", regression)
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,10 @@
+<?php
+
+// Serves the word "slow" at /slow, after a delay of two seconds
+// Used for checking that slow requests are logged
+
+if ( !defined('WP_CLI') && $_SERVER['REQUEST_URI'] == '/slow' ) {
+	sleep(2);
+	echo("slow");
+	exit;
+}
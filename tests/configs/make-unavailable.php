@@ -0,0 +1,9 @@
+<?php
+
+// Responds with "503 Service Unavailable" to requests with an "X-Test-Unavailable" header
+// Used for checking that kept copies of responses are served when PHP-FPM fails
+
+if ( !defined('WP_CLI') && isset($_SERVER['HTTP_X_TEST_UNAVAILABLE']) ) {
+	http_response_code(503);
+	exit;
+}
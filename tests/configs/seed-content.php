@@ -0,0 +1,192 @@
+<?php
+/**
+ * Generate content in bulk for scale testing, in a single process
+ *
+ * Usage: wp eval-file seed-content.php {posts|media|postmeta} <total> <seed>
+ *
+ * Content is added until there are <total> published posts, media items (attachments) or
+ * postmeta rows.  Rows are inserted in batches directly into the tables, and the counts of
+ * the categories assigned to posts are updated once at the end.  The generated content is
+ * determined by the seed and the existing content.
+ */
+
+const SEED_BATCH_SIZE = 1000;
+const SEED_CATEGORIES = 20;
+const SEED_WORDS = array(
+	'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed',
+	'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna',
+	'aliqua', 'enim', 'ad', 'minim', 'veniam', 'quis', 'nostrud', 'exercitation',
+);
+
+/**
+ * Return a string of random words
+ */
+function seed_words( $count ) {
+	$words = array();
+	for ( $i = 0; $i < $count; $i++ ) {
+		$words[] = SEED_WORDS[ mt_rand( 0, count( SEED_WORDS ) - 1 ) ];
+	}
+	return implode( ' ', $words );
+}
+
+/**
+ * Insert rows into a table in batches
+ *
+ * Rows are supplied by a generator of value arrays, in the order of the given columns.
+ */
+function seed_insert( $table, array $columns, $rows ) {
+	global $wpdb;
+
+	$head = "INSERT INTO {$table} (" . implode( ',', $columns ) . ') VALUES ';
+	$batch = array();
+	foreach ( $rows as $row ) {
+		$values = array_map( function( $value ) {
+			return is_int( $value ) ? $value : "'" . esc_sql( $value ) . "'";
+		}, $row );
+		$batch[] = '(' . implode( ',', $values ) . ')';
+		if ( count( $batch ) >= SEED_BATCH_SIZE ) {
+			$wpdb->query( $head . implode( ',', $batch ) );
+			$batch = array();
+		}
+	}
+	if ( $batch ) {
+		$wpdb->query( $head . implode( ',', $batch ) );
+	}
+}
+
+/**
+ * Return the term taxonomy IDs of the seeded categories, creating them if needed
+ */
+function seed_categories() {
+	$ids = array();
+	for ( $i = 1; $i <= SEED_CATEGORIES; $i++ ) {
+		$slug = "seed-category-{$i}";
+		$term = term_exists( $slug, 'category' )
+			?: wp_insert_term( "Seed Category {$i}", 'category', array( 'slug' => $slug ) );
+		$ids[] = (int) $term['term_taxonomy_id'];
+	}
+	return $ids;
+}
+
+/**
+ * Add posts of a type until there are the given total, returning the number added
+ */
+function seed_posts( $type, $total ) {
+	global $wpdb;
+
+	$status = $type == 'attachment' ? 'inherit' : 'publish';
+	$existing = (int) $wpdb->get_var( $wpdb->prepare(
+		"SELECT COUNT(*) FROM {$wpdb->posts} WHERE post_type = %s AND post_status = %s",
+		$type, $status
+	) );
+	$count = max( 0, $total - $existing );
+	$first = (int) $wpdb->get_var( "SELECT COALESCE(MAX(ID), 0) + 1 FROM {$wpdb->posts}" );
+	$last = $first + $count - 1;
+	$home = home_url( '/' );
+	$uploads = wp_get_upload_dir()['baseurl'];
+	$epoch = strtotime( '2020-01-01 00:00:00 UTC' );
+
+	seed_insert(
+		$wpdb->posts,
+		array(
+			'ID', 'post_author', 'post_date', 'post_date_gmt', 'post_content', 'post_title',
+			'post_excerpt', 'post_status', 'post_name', 'to_ping', 'pinged', 'post_modified',
+			'post_modified_gmt', 'post_content_filtered', 'guid', 'post_type', 'post_mime_type',
+		),
+		(function() use ( $first, $last, $type, $status, $home, $uploads, $epoch ) {
+			for ( $id = $first; $id <= $last; $id++ ) {
+				$date = gmdate( 'Y-m-d H:i:s', $epoch + $id * 60 );
+				$attachment = $type == 'attachment';
+				yield array(
+					$id, 1, $date, $date,
+					$attachment ? '' : seed_words( mt_rand( 50, 500 ) ),
+					ucfirst( seed_words( mt_rand( 2, 8 ) ) ),
+					'', $status, "seed-{$type}-{$id}", '', '', $date, $date, '',
+					$attachment ? "{$uploads}/seed/{$id}.jpg" : "{$home}?p={$id}",
+					$type,
+					$attachment ? 'image/jpeg' : '',
+				);
+			}
+		})()
+	);
+
+	if ( $type == 'attachment' ) {
+		seed_insert(
+			$wpdb->postmeta,
+			array( 'post_id', 'meta_key', 'meta_value' ),
+			(function() use ( $first, $last ) {
+				for ( $id = $first; $id <= $last; $id++ ) {
+					yield array( $id, '_wp_attached_file', "seed/{$id}.jpg" );
+				}
+			})()
+		);
+		return $count;
+	}
+
+	$categories = seed_categories();
+	seed_insert(
+		$wpdb->term_relationships,
+		array( 'object_id', 'term_taxonomy_id' ),
+		(function() use ( $first, $last, $categories ) {
+			for ( $id = $first; $id <= $last; $id++ ) {
+				yield array( $id, $categories[ mt_rand( 0, count( $categories ) - 1 ) ] );
+			}
+		})()
+	);
+	wp_update_term_count_now( $categories, 'category' );
+	return $count;
+}
+
+/**
+ * Add postmeta rows to existing posts until there are the given total, returning the number
+ * added
+ */
+function seed_postmeta( $total ) {
+	global $wpdb;
+
+	$existing = (int) $wpdb->get_var( "SELECT COUNT(*) FROM {$wpdb->postmeta}" );
+	$count = max( 0, $total - $existing );
+	$posts = $wpdb->get_col( "SELECT ID FROM {$wpdb->posts} ORDER BY ID" );
+	if ( $count && !$posts ) {
+		WP_CLI::error( 'Posts are needed before postmeta can be added' );
+	}
+
+	seed_insert(
+		$wpdb->postmeta,
+		array( 'post_id', 'meta_key', 'meta_value' ),
+		(function() use ( $count, $posts ) {
+			for ( $i = 0; $i < $count; $i++ ) {
+				yield array(
+					(int) $posts[ mt_rand( 0, count( $posts ) - 1 ) ],
+					'seed_meta_' . mt_rand( 1, 50 ),
+					seed_words( mt_rand( 1, 20 ) ),
+				);
+			}
+		})()
+	);
+	return $count;
+}
+
+
+list( $kind, $total, $seed ) = $args;
+mt_srand( (int) $seed );
+wp_defer_term_counting( true );
+wp_suspend_cache_addition( true );
+
+switch ( $kind ) {
+	case 'posts':
+		$added = seed_posts( 'post', (int) $total );
+		break;
+	case 'media':
+		$added = seed_posts( 'attachment', (int) $total );
+		break;
+	case 'postmeta':
+		$added = seed_postmeta( (int) $total );
+		break;
+	default:
+		WP_CLI::error( "Unknown content kind: {$kind}" );
+}
+
+wp_defer_term_counting( false );
+wp_cache_flush();
+WP_CLI::success( "Added {$added} {$kind}" );
@@ -0,0 +1,39 @@
+<?php
+/*
+Plugin Name: Test Image Uploads
+Description: Uploads generated images in requests, as through the media library
+*/
+
+add_action( 'rest_api_init', function() {
+	register_rest_route( 'test/v1', '/upload-image', array(
+		'methods' => WP_REST_Server::READABLE,
+		'callback' => function($request) {
+			if ( !isset($request['name']) ) {
+				return new WP_Error('Missing param name');
+			}
+			require_once ABSPATH . 'wp-admin/includes/file.php';
+			require_once ABSPATH . 'wp-admin/includes/media.php';
+			require_once ABSPATH . 'wp-admin/includes/image.php';
+
+			// Large enough for every default intermediate size to be generated
+			$image = new Imagick();
+			$image->newImage(2000, 1500, 'steelblue', 'png');
+			$file = wp_tempnam("{$request['name']}.png");
+			$image->writeImage($file);
+
+			$file_array = array( 'name' => "{$request['name']}.png", 'tmp_name' => $file );
+			$id = media_handle_sideload($file_array, 0, $request['name']);
+			if ( is_wp_error($id) ) {
+				@unlink($file);
+				return $id;
+			}
+			return rest_ensure_response( "Image uploaded" );
+		},
+		'args' => array(
+			'name' => array(
+				'description' => 'Name of the image to upload',
+				'type' => 'string',
+			)
+		)
+	));
+});
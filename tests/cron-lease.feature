@@ -0,0 +1,36 @@
+@long-running
+
+Feature: Cron lease
+	Of all the backends sharing a database, only the one holding the cron lease
+	runs cron events.  In these scenarios the backend's own cron runner
+	competes for the lease with other runners, named "runner-a" and
+	"runner-b", which use the same commands as the backend's runner.
+
+	Background:
+		Given the site is not running
+		And the environment variable CRON_LEASE_TTL is "3"
+		And the environment variable FPM_SHUTDOWN_DELAY is "0"
+		When the site is started
+
+	Scenario: The backend's cron runner takes and renews the lease
+		When 5 seconds have passed
+		And "wp cron-lease acquire runner-b --ttl=3" is run
+		Then the command fails
+
+	Scenario: The lease is handed over when its holder stops
+		When the backend's cron runner is stopped
+		And "wp cron-lease acquire runner-b --ttl=3" is run
+		Then the command succeeds
+
+	Scenario: A lease is renewed by its holder and taken over once expired
+		When the backend's cron runner is stopped
+		And "wp cron-lease acquire runner-b --ttl=3" is run
+		And "wp cron-lease acquire runner-b --ttl=3" is run
+		Then the command succeeds
+		When "wp cron-lease acquire runner-a --ttl=3" is run
+		Then the command fails
+		When 5 seconds have passed
+		And "wp cron-lease acquire runner-a --ttl=3" is run
+		Then the command succeeds
+		When "wp cron-lease acquire runner-b --ttl=3" is run
+		Then the command fails
@@ -0,0 +1,209 @@
+#  Copyright 2026  Dominik Sekotill <dom.sekotill@kodo.org.uk>
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Fast snapshots and rollbacks of database fixtures
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
+from dataclasses import field
+from subprocess import PIPE
+from subprocess import Popen
+from time import perf_counter
+
+from behave import fixture
+from behave.runner import Context
+from behave_utils.docker import DOCKER
+from behave_utils.mysql import Mysql
+from behave_utils.mysql import MysqlContainer
+
+
+@dataclass
+class ResetTimes:
+	"""
+	Accumulated durations, in seconds, of database snapshots and restores
+	"""
+
+	snapshots: list[float] = field(default_factory=list)
+	restores: list[float] = field(default_factory=list)
+
+	def __str__(self) -> str:
+		return (
+			f"Database resets: {len(self.snapshots)} snapshots in {sum(self.snapshots):.2f}s, "
+			f"{len(self.restores)} restores in {sum(self.restores):.2f}s"
+		)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+	"""
+	Checksums and auto-increment counters of a database's tables when copied to its template
+	"""
+
+	checksums: dict[str, str]
+	counters: dict[str, int]
+
+
+RESET_TIMES = ResetTimes()
+SNAPSHOTS = dict[str, Snapshot]()
+
+
+@fixture
+def template_rollback(context: Context, /, database: Mysql) -> Iterator[None]:
+	"""
+	Manage the state of a database as a revertible fixture
+
+	Like `behave_utils.mysql.snapshot_rollback`, at the end of the fixture's lifetime the
+	database's state at the beginning is restored; tables created during the fixture's
+	lifetime are dropped.
+
+	Instead of dumping and reloading the database as SQL text, tables are copied into
+	a template database by the server itself the first time the fixture is used with
+	a database.  On rollback only the tables whose checksums no longer match the template
+	are copied back, and every table's AUTO_INCREMENT counter is reset, so row IDs are the
+	same for every feature.
+	"""
+	template = f"{database.name}-template"
+
+	if (snapshot := SNAPSHOTS.get(database.name)) is None:
+		start = perf_counter()
+		tables = _get_tables(database)
+		database.mysql(
+			input="\n".join([
+				f"DROP DATABASE IF EXISTS `{template}`;",
+				f"CREATE DATABASE `{template}`;",
+				*(
+					f"CREATE TABLE `{template}`.`{table}` LIKE `{table}`;\n"
+					f"INSERT INTO `{template}`.`{table}` SELECT * FROM `{table}`;"
+					for table in tables
+				),
+			]).encode("utf-8"),
+		)
+		snapshot = SNAPSHOTS[database.name] = Snapshot(
+			_get_checksums(database, tables), _get_counters(database),
+		)
+		context.add_cleanup(_drop_template, database, layer="testrun")
+		RESET_TIMES.snapshots.append(perf_counter() - start)
+		logging.debug("Snapshot of %s took %.2fs", database.name, RESET_TIMES.snapshots[-1])
+
+	yield
+
+	start = perf_counter()
+	current = _get_checksums(database, _get_tables(database))
+	changed = [
+		table for table, checksum in snapshot.checksums.items()
+		if current.get(table) != checksum
+	]
+	dropped = [
+		table for table in current
+		if table not in snapshot.checksums or table in changed
+	]
+	database.mysql(
+		input="\n".join([
+			"SET FOREIGN_KEY_CHECKS = 0;",
+			*([f"DROP TABLE {', '.join(f'`{t}`' for t in dropped)};"] if dropped else []),
+			*(
+				f"CREATE TABLE `{table}` LIKE `{template}`.`{table}`;\n"
+				f"INSERT INTO `{table}` SELECT * FROM `{template}`.`{table}`;"
+				for table in changed
+			),
+			*(
+				f"ALTER TABLE `{table}` AUTO_INCREMENT = {counter};"
+				for table, counter in snapshot.counters.items()
+			),
+		]).encode("utf-8"),
+	)
+	RESET_TIMES.restores.append(perf_counter() - start)
+	logging.debug(
+		"Restore of %s (%d changed tables) took %.2fs",
+		database.name, len(changed), RESET_TIMES.restores[-1],
+	)
+
+
+@fixture
+def held_lock(context: Context, /, database: Mysql, name: str) -> Iterator[None]:
+	"""
+	Hold a named MySQL advisory lock on a database, as backends do, as a fixture
+
+	The lock is scoped to the database in the same way as by scripts/db-lock.php, and is
+	held by a client session which is ended when the fixture's lifetime ends.
+	"""
+	server = MysqlContainer.get_running()
+	cmd = [
+		DOCKER, "exec", "--interactive", server.get_id(),
+		"mysql", "--unbuffered", "--skip-column-names", database.name,
+	]
+	with Popen(cmd, stdin=PIPE, stdout=PIPE) as client:
+		assert client.stdin is not None and client.stdout is not None
+		client.stdin.write(f"SELECT GET_LOCK('{database.name}:{name}', 0);\n".encode())
+		client.stdin.flush()
+		reply = client.stdout.readline().strip()
+		assert reply == b"1", f"failed to take the {name} lock: {reply!r}"
+		yield
+		client.stdin.close()
+
+
+def kill_lock_waits(database: Mysql, name: str) -> int:
+	"""
+	Interrupt the sessions waiting for a named MySQL advisory lock; return their number
+	"""
+	sessions = database.mysql(
+		"--skip-column-names",
+		"--execute=SELECT ID FROM information_schema.PROCESSLIST "
+		f"WHERE INFO LIKE 'SELECT GET_LOCK(''{database.name}:{name}''%'",
+		deserialiser=lambda mv: str(mv, "utf-8").split(),
+	)
+	for session in sessions:
+		database.mysql(f"--execute=KILL QUERY {session}")
+	return len(sessions)
+
+
+def _drop_template(database: Mysql) -> None:
+	del SNAPSHOTS[database.name]
+	template = f"{database.name}-template"
+	database.mysql(input=f"DROP DATABASE IF EXISTS `{template}`;".encode("utf-8"))
+
+
+def _get_tables(database: Mysql) -> list[str]:
+	return database.mysql(
+		"--skip-column-names", "--execute=SHOW TABLES",
+		deserialiser=lambda mv: str(mv, "utf-8").split(),
+	)
+
+
+def _get_checksums(database: Mysql, tables: list[str]) -> dict[str, str]:
+	if not tables:
+		return {}
+	# Rows are "<database>.<table>	<checksum>"
+	return database.mysql(
+		"--skip-column-names",
+		f"--execute=CHECKSUM TABLE {', '.join(f'`{t}`' for t in tables)}",
+		deserialiser=lambda mv: {
+			name.split(".", 1)[1]: checksum
+			for name, checksum in (
+				line.rsplit("\t", 1) for line in str(mv, "utf-8").splitlines()
+			)
+		},
+	)
+
+
+def _get_counters(database: Mysql) -> dict[str, int]:
+	# MySQL caches table statistics, including AUTO_INCREMENT, unless told not to
+	return database.mysql(
+		"--skip-column-names",
+		"--execute="
+		"SET SESSION information_schema_stats_expiry = 0; "
+		"SELECT TABLE_NAME, AUTO_INCREMENT FROM information_schema.TABLES "
+		f"WHERE TABLE_SCHEMA = '{database.name}' AND AUTO_INCREMENT IS NOT NULL",
+		deserialiser=lambda mv: {
+			table: int(counter)
+			for table, counter in (line.split("\t") for line in str(mv, "utf-8").splitlines())
+		},
+	)
@@ -23,7 +23,9 @@ from behave.model import Feature
 from behave.model import Scenario
 from behave.runner import Context
 from behave_utils.behave import register_pattern
-from behave_utils.mysql import snapshot_rollback
+from database import RESET_TIMES
+from database import template_rollback
+from memory import MEMORY_USAGE
 from wp import running_site_fixture
 
 if TYPE_CHECKING:
@@ -46,7 +48,7 @@ def before_feature(context: FeatureContext, feature: Feature) -> None:
 	Prepare/revert fixtures before each feature
 	"""
 	site = use_fixture(running_site_fixture, context)
-	use_fixture(snapshot_rollback, context, site.database)
+	use_fixture(template_rollback, context, site.database)
 
 
 def before_scenario(context: ScenarioContext, scenario: Scenario) -> None:
@@ -55,6 +57,22 @@ def before_scenario(context: ScenarioContext, scenario: Scenario) -> None:
 	"""
 
 
+def after_scenario(context: ScenarioContext, scenario: Scenario) -> None:
+	"""
+	Collect measurements of requests made during each scenario, before its sites are removed
+	"""
+	MEMORY_USAGE.collect()
+
+
+def after_all(context: Context) -> None:
+	"""
+	Report on fixtures used by all tests
+	"""
+	sys.stderr.write(f"{RESET_TIMES}\n")
+	if MEMORY_USAGE.peaks:
+		sys.stderr.write(f"{MEMORY_USAGE}\n")
+
+
 if not sys.stderr.isatty():
 	import logging
 
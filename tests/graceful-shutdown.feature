@@ -0,0 +1,13 @@
+@long-running
+
+Feature: Graceful shutdown
+	When a site is stopped in the same sequence as a Kubernetes pod (with the
+	"preStop" hooks in deployment/deployment.yaml) requests in flight should
+	complete, and no requests should fail with server errors.
+
+	Scenario: Requests made during a shutdown do not fail
+		Given the site is not running
+		And the environment variable FPM_SHUTDOWN_DELAY is "5"
+		When the site is started
+		And the homepage is requested continuously while the site is shut down
+		Then no server errors were returned
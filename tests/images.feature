@@ -0,0 +1,64 @@
+@long-running
+
+Feature: Image processing
+	ImageMagick is limited to the CPUs available to the backend, and the
+	intermediate sizes of uploaded images can be generated by the cron runner
+	instead of during uploads.
+
+	Scenario: Image processing threads are limited to the backend's CPU quota
+		Given the site is not running
+		And the backend is limited to 1 CPU
+		When the site is started
+		Then the backend log contains:
+			"""
+			Limiting image processing to 1 threads per process
+			"""
+
+	Scenario: IMAGE_THREADS overrides the CPU quota
+		Given the site is not running
+		And the backend is limited to 1 CPU
+		And the environment variable IMAGE_THREADS is "3"
+		When the site is started
+		Then the backend log contains:
+			"""
+			Limiting image processing to 3 threads per process
+			"""
+
+	Scenario Outline: IMAGE_DEFER_SIZES is parsed as a boolean
+		Given the site is not running
+		And the environment variable IMAGE_DEFER_SIZES is "<value>"
+		When the site is started
+		And "wp eval 'var_export(IMAGE_DEFER_SIZES);'" is run
+		Then "<enabled>" is seen from stdout
+
+		Examples:
+			| value | enabled |
+			| true  | true    |
+			| yes   | true    |
+			| false | false   |
+			| no    | false   |
+			| off   | false   |
+			| 0     | false   |
+			|       | false   |
+
+	Scenario: Sizes of uploaded images are generated later by a cron event
+		Given the site is not running
+		And upload-image.php is mounted in /app/wp-content/mu-plugins/
+		And the environment variable IMAGE_DEFER_SIZES is "true"
+		When the site is started
+		And the backend's cron runner is stopped
+		And /wp-json/test/v1/upload-image?name=deferred is requested
+		Then OK is returned
+		And the image deferred has no intermediate sizes
+		When "wp cron event run --due-now" is run
+		Then the command succeeds
+		And the image deferred has intermediate sizes
+
+	Scenario: Sizes of uploaded images are generated during uploads by default
+		Given the site is not running
+		And upload-image.php is mounted in /app/wp-content/mu-plugins/
+		When the site is started
+		And the backend's cron runner is stopped
+		And /wp-json/test/v1/upload-image?name=immediate is requested
+		Then OK is returned
+		And the image immediate has intermediate sizes
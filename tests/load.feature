@@ -0,0 +1,13 @@
+Feature: Concurrent requests
+	Pages should be served to many concurrent clients without errors, and
+	within reasonable times, as requests are queued for PHP workers.
+
+	Scenario: Concurrent homepage requests
+		When the homepage is requested 200 times with 20 concurrent clients
+		Then every response is OK
+		And 95% of responses complete within 2000 ms
+
+	Scenario: Concurrent static file requests
+		When /wp-includes/js/jquery/jquery.min.js is requested 500 times with 20 concurrent clients
+		Then every response is OK
+		And 95% of responses complete within 200 ms
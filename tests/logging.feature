@@ -0,0 +1,39 @@
+Feature: Logging
+	The frontend writes access log lines as JSON objects, and the backend
+	writes backtraces of slow requests to its log.
+
+	Scenario: Access log lines are JSON objects with the documented fields
+		When /?access-log-test is requested
+		Then OK is returned
+		And the frontend logs the request as JSON with the fields
+			| field                  |
+			| time                   |
+			| request_id             |
+			| remote_addr            |
+			| method                 |
+			| uri                    |
+			| status                 |
+			| bytes_sent             |
+			| request_time           |
+			| upstream_connect_time  |
+			| upstream_header_time   |
+			| upstream_response_time |
+			| upstream_cache_status  |
+			| referrer               |
+			| user_agent             |
+
+	Scenario: Slow requests are logged with a backtrace
+		Given the site is not running
+		And the environment variable FPM_SLOWLOG_TIMEOUT is "1s"
+		And make-slow.php is mounted in /etc/wordpress/ as slow-config.php
+		When the site is started
+		And /slow is requested
+		Then OK is returned
+		And the backend log contains
+			"""
+			executing too slow
+			"""
+		And the backend log contains
+			"""
+			sleep() /etc/wordpress/slow-config.php
+			"""
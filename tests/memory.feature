@@ -0,0 +1,18 @@
+Feature: PHP memory budgets
+	The peak memory used by PHP to handle a request limits how many workers fit
+	in a pod.  Common pages should stay within a budget, so that upgrades or
+	plugins that significantly increase memory use are noticed.
+
+	Scenario: Homepage
+		When the homepage is requested
+		Then OK is returned
+		And the request used no more than 32 MiB of PHP memory
+
+	Scenario Outline: Other pages
+		Then <path> uses no more than <budget> MiB of PHP memory
+
+		Examples:
+			| path                  | budget |
+			| /wp-json/wp/v2/posts  | 32     |
+			| /wp-login.php         | 32     |
+			| /?s=lorem             | 32     |
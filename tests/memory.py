@@ -0,0 +1,118 @@
+#  Copyright 2026  Dominik Sekotill <dom.sekotill@kodo.org.uk>
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Collection of the peak PHP memory usage of requests made to site fixtures
+
+Requests are tagged with unique "X-Request-ID" headers, which the frontend passes to the
+backend, where PHP-FPM writes them to its access log along with the peak memory used while
+handling them (see data/fpm.conf).
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from dataclasses import field
+from subprocess import PIPE
+from subprocess import STDOUT
+from subprocess import run
+from uuid import uuid4
+
+from behave_utils import URL
+from behave_utils.docker import DOCKER
+from behave_utils.docker import inspect
+from behave_utils.utils import wait
+from wp import Wordpress
+
+# Lines of "docker logs --timestamps" output are prefixed with the time they were logged
+ACCESS_LOG_LINE = re.compile(
+	rb"^\S+ \[[^]]+\] (?P<id>\S+) .* mem=(?P<kib>[0-9]+) KiB;", re.M,
+)
+REPORT_COUNT = 10
+
+
+@dataclass
+class MemoryUsage:
+	"""
+	Peak PHP memory usage of requests to site fixtures, in KiB, by URL path
+	"""
+
+	pending: dict[str, tuple[Wordpress, URL]] = field(default_factory=dict)
+	peaks: dict[URL, int] = field(default_factory=dict)
+	read_to: dict[Wordpress, str] = field(default_factory=dict)
+
+	def __str__(self) -> str:
+		top = sorted(self.peaks.items(), key=lambda item: item[1], reverse=True)
+		lines = [f"Peak PHP memory of requests (top {REPORT_COUNT}):"]
+		lines.extend(f"  {kib:>8} KiB  {url}" for url, kib in top[:REPORT_COUNT])
+		return "\n".join(lines)
+
+	def tag_request(self, backend: Wordpress, url: URL) -> dict[str, str]:
+		"""
+		Return headers identifying a request for a URL, to be sent with the request
+		"""
+		request_id = uuid4().hex
+		self.pending[request_id] = backend, url
+		return {"X-Request-ID": request_id}
+
+	def collect(self) -> None:
+		"""
+		Look up the memory usage of all pending requests in their backends' access logs
+
+		Requests that did not reach a backend are discarded.
+		"""
+		backends = {backend for backend, _ in self.pending.values()}
+		for backend in backends:
+			for request_id, kib in self._read_access_log(backend).items():
+				self._record(request_id, kib)
+		self.pending.clear()
+
+	def get(self, request_id: str, timeout: float = 10) -> int:
+		"""
+		Return the peak memory used by a tagged request, waiting for it to be logged
+
+		`TimeoutError` is raised if the request is not logged by its backend in time, for
+		instance because the frontend served it from its cache or a static file.
+		"""
+		backend, url = self.pending[request_id]
+		usage = dict[str, int]()
+
+		def logged() -> bool:
+			usage.update(self._read_access_log(backend))
+			return request_id in usage
+
+		try:
+			wait(logged, timeout=timeout)
+		except TimeoutError:
+			raise TimeoutError(
+				f"Request {request_id} for {url} was not logged by PHP-FPM within {timeout}s; "
+				f"it may not have reached the backend",
+			) from None
+		self._record(request_id, usage[request_id])
+		return usage[request_id]
+
+	def _record(self, request_id: str, kib: int) -> None:
+		if request_id not in self.pending:
+			return
+		_, url = self.pending.pop(request_id)
+		self.peaks[url] = max(kib, self.peaks.get(url, 0))
+
+	def _read_access_log(self, backend: Wordpress) -> dict[str, int]:
+		# Only lines logged since the last read are fetched; "--since" is inclusive, so the
+		# last line of the previous read is read again, which is harmless.
+		since = self.read_to.get(backend) or inspect(backend).path("$.State.StartedAt", str)
+		cmd = [DOCKER, "logs", "--timestamps", f"--since={since}", backend.get_id()]
+		output = run(cmd, stdout=PIPE, stderr=STDOUT).stdout
+		if (lines := output.rstrip(b"\n")):
+			self.read_to[backend] = lines.rsplit(b"\n", 1)[-1].split(b" ", 1)[0].decode()
+		return {
+			match["id"].decode(): int(match["kib"])
+			for match in ACCESS_LOG_LINE.finditer(output)
+		}
+
+
+MEMORY_USAGE = MemoryUsage()
@@ -0,0 +1,22 @@
+Feature: Prometheus metrics
+	Metrics for Nginx and PHP-FPM are served in the Prometheus text format
+	from a separate port of the frontend.
+
+	Scenario: Metrics from both servers are available
+		When the metrics are requested
+		Then OK is returned
+		And the response body contains:
+			"""
+			phpfpm_up 1
+			"""
+		And the response body contains:
+			"""
+			nginx_connections_active
+			"""
+
+	Scenario: Request latencies are recorded
+		When /?metrics-test is requested
+		And the metrics are requested
+		Then OK is returned
+		And the metric nginx_http_request_duration_seconds_count{backend="php"} is greater than zero
+		And the metric nginx_http_request_duration_seconds_bucket{backend="php",le="+Inf"} is greater than zero
@@ -13,12 +13,14 @@ from __future__ import annotations
 import atexit
 import json
 from collections.abc import Iterator
+from dataclasses import dataclass
 from gzip import GzipFile
+from os import environ
 from pathlib import Path
+from shlex import quote
 from typing import ClassVar
 from typing import TypeAlias
-from uuid import NAMESPACE_URL
-from uuid import uuid3
+from uuid import uuid4
 
 from behave import fixture
 from behave.runner import Context
@@ -29,18 +31,22 @@ from behave_utils.docker import Container
 from behave_utils.docker import Image
 from behave_utils.docker import Network
 from behave_utils.secret import make_secret
-from behave_utils.utils import wait
 from requests import Session
 from typing_extensions import Self
 from wp import Site
+from wp import wait_for_output
 
 BucketsKey: TypeAlias = tuple[str, bool]
 
 CURRENT_BUCKET_KEY: BucketsKey = "current://", True
 
 MINIO_IMAGE = Image.pull(f"quay.io/minio/minio:latest")
+MINIO_READY = [b"API: "]
+MC_VERSION = environ.get("MC_VERSION", "latest")
+POOL_BATCH = 4
 
 __all__ = [
+	"Account",
 	"Bucket",
 	"Minio",
 	"bucket_fixture",
@@ -50,17 +56,38 @@ __all__ = [
 
 class DownloadableMC(DownloadableExecutable, name="minio-client"):
 
+	@property
+	def release_url(self) -> URL:
+		return URL(f"https://dl.min.io/client/mc/release/{self.kernel}-{self.goarch}/")
+
+	@property
+	def binary(self) -> str:
+		return "mc.exe" if self.kernel == "windows" else "mc"
+
 	def get_latest(self, session: Session) -> str:
-		return "latest"
+		# The checksum file names the release of the latest binary, e.g.
+		# "<sha256>  mc.RELEASE.2024-11-21T17-21-54Z"
+		resp = session.get(self.release_url / f"{self.binary}.sha256sum")
+		return resp.text.split()[1].removeprefix(f"{self.binary}.")
 
 	def get_stream(self, session: Session, version: str) -> GzipFile:
-		binary = "mc.exe" if self.kernel == "windows" else "mc"
-		url = f"https://dl.min.io/client/mc/release/{self.kernel}-{self.goarch}/{binary}"
+		url = self.release_url / f"archive/{self.binary}.{version}"
 		resp = session.get(url, allow_redirects=True, stream=True)
 		assert resp.raw is not None
 		return GzipFile(fileobj=resp.raw)
 
 
+@dataclass(frozen=True)
+class Account:
+	"""
+	A bucket and the credentials of an account with access to it
+	"""
+
+	bucket: str
+	key: str
+	secret: str
+
+
 class Minio(Container):
 	"""
 	A `Container` subclass to run and manage a Minio S3 service
@@ -84,7 +111,7 @@ class Minio(Container):
 		self.key = make_secret(8)
 		self.secret = make_secret(20)
 
-		mc_bin = DownloadableMC("latest").get_binary()
+		mc_bin = DownloadableMC(MC_VERSION).get_binary()
 		Container.__init__(
 			self, MINIO_IMAGE,
 			["server", "/tmp", "--address=:80", "--console-address=:9001"],
@@ -96,6 +123,7 @@ class Minio(Container):
 			),
 		)
 		self.mc = Cli(self, "/bin/mc")
+		self.pool = list[Account]()
 
 	def start(self) -> None:
 		"""
@@ -105,7 +133,7 @@ class Minio(Container):
 			return
 		super().start()
 		atexit.register(self.stop, rm=True)
-		wait(lambda: self.is_running())
+		wait_for_output(self, MINIO_READY)
 		# Add "local" alias
 		self.mc("config", "host", "add", "local", "http://localhost", self.key, self.secret)
 
@@ -129,39 +157,58 @@ class Minio(Container):
 		base = URL(f"http://{domain}")
 		return base if use_subdomain else (base / bucket)
 
-	def add_bucket_user(self, bucket: str, key: str, secret: str) -> None:
-		"""
-		Create an ephemeral bucket and account with access to that bucket
-		"""
-		policy = f"{bucket}-write"
-		stmt = json.dumps(
-			dict(
-				Version="2012-10-17",
-				Statement=[
-					dict(
-						Effect="Allow",
-						Action=["s3:ListBucket"],
-						Resource=[f"arn:aws:s3:::{bucket}"],
-					),
-					dict(
-						Effect="Allow",
-						Action=["s3:GetObject", "s3:PutObject", "s3:DeleteObject"],
-						Resource=[f"arn:aws:s3:::{bucket}/*"],
-					),
-				],
-			),
-		)
-		self.mc("mb", f"local/{bucket}")
-		self.mc("admin", "user", "add", "local", key, secret)
-		self.mc("admin", "policy", "create", "local", policy, "/dev/stdin", input=stmt)
-		self.mc("admin", "policy", "attach", "local", policy, "--user", key)
+	def acquire_account(self) -> Account:
+		"""
+		Return a bucket and an account with access to it, from a pool of unused buckets
 
-	def rm_bucket_user(self, bucket: str, key: str) -> None:
+		If the pool is empty a batch of buckets and accounts are created.
 		"""
-		Remove an ephemeral bucket and user
+		if not self.pool:
+			self.provision_accounts(POOL_BATCH)
+		return self.pool.pop()
+
+	def release_account(self, account: Account) -> None:
+		"""
+		Empty an account's bucket and return it to the pool for reuse
 		"""
-		self.mc("admin", "user", "rm", "local", key)
-		self.mc("rb", f"local/{bucket}", "--force")
+		self.mc("rm", "--recursive", "--force", f"local/{account.bucket}")
+		self.pool.append(account)
+
+	def provision_accounts(self, count: int) -> None:
+		"""
+		Create buckets and accounts with access to them, and add them to the pool
+
+		All the administration commands are run with a single call to the container.
+		"""
+		accounts = [Account(uuid4().hex, make_secret(8), make_secret(20)) for _ in range(count)]
+		script = ["set -e"]
+		for account in accounts:
+			policy = f"{account.bucket}-write"
+			stmt = json.dumps(
+				dict(
+					Version="2012-10-17",
+					Statement=[
+						dict(
+							Effect="Allow",
+							Action=["s3:ListBucket"],
+							Resource=[f"arn:aws:s3:::{account.bucket}"],
+						),
+						dict(
+							Effect="Allow",
+							Action=["s3:GetObject", "s3:PutObject", "s3:DeleteObject"],
+							Resource=[f"arn:aws:s3:::{account.bucket}/*"],
+						),
+					],
+				),
+			)
+			script += [
+				f"/bin/mc mb local/{account.bucket}",
+				f"/bin/mc admin user add local {quote(account.key)} {quote(account.secret)}",
+				f"echo {quote(stmt)} | /bin/mc admin policy create local {policy} /dev/stdin",
+				f"/bin/mc admin policy attach local {policy} --user {quote(account.key)}",
+			]
+		self.run(["sh", "-c", "\n".join(script)], check=True)
+		self.pool.extend(accounts)
 
 	def has_path(self, bucket: str, path: Path) -> bool:
 		"""
@@ -177,34 +224,34 @@ class Bucket:
 	"""
 	An ephemeral bucket fixture within an S3 service
 
-	To create the bucket on the server and update name records, an instance must be used as
-	a context manager.  Once the context ends, the bucket is removed.
+	To take a bucket from the server's pool and update name records, an instance must be
+	used as a context manager.  Once the context ends, the bucket is emptied and returned to
+	the pool.
 	"""
 
 	def __init__(
 		self,
-		ident: str,
 		use_subdomain: bool,
 		network: Network,
 		server: Minio|None = None,
 	):
 		self.network = network
 		self.server = server or Minio.get_running()
-
-		self.name = str(uuid3(NAMESPACE_URL, ident))
-		self.domain = self.server.bucket_domain(self.name, use_subdomain)
-		self.url = self.server.bucket_url(self.name, use_subdomain)
-		self.key = make_secret(8)
-		self.secret = make_secret(20)
+		self.use_subdomain = use_subdomain
 
 	def __enter__(self) -> Self:
 		self.server.start() # Ensure server is started, method is idempotent
-		self.server.add_bucket_user(self.name, self.key, self.secret)
+		self.account = self.server.acquire_account()
+		self.name = self.account.bucket
+		self.key = self.account.key
+		self.secret = self.account.secret
+		self.domain = self.server.bucket_domain(self.name, self.use_subdomain)
+		self.url = self.server.bucket_url(self.name, self.use_subdomain)
 		self.server.connect(self.network, self.domain)
 		return self
 
 	def __exit__(self, *_: object) -> None:
-		self.server.rm_bucket_user(self.name, self.key)
+		self.server.release_account(self.account)
 		self.server.disconnect(self.network, self.domain)
 
 	def has_path(self, path: Path) -> bool:
@@ -228,7 +275,7 @@ def bucket_fixture(context: Context, /, site: Site, use_subdomain: bool) -> Iter
 		yield bucket
 		return
 	prev = buckets.get(CURRENT_BUCKET_KEY, None)
-	with Bucket(site.url, use_subdomain, site.network) as bucket:
+	with Bucket(use_subdomain, site.network) as bucket:
 		buckets[key] = buckets[CURRENT_BUCKET_KEY] = bucket
 		yield bucket
 	del buckets[key]
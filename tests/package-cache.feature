@@ -0,0 +1,40 @@
+@long-running
+
+Feature: Package cache
+	Backends sharing a PACKAGE_CACHE directory download each package once, and
+	download again any cached package which fails its checksum.
+
+	Background:
+		Given the site is not running
+		And plugins.conf is mounted in /etc/wordpress/
+		And the backends share a package cache
+
+	Scenario: Backends starting together download each package once
+		Given the site has 2 backends
+		When the site is started
+		Then the plugin wp-dummy-content-generator is installed
+		And the log of 1 backend contains:
+			"""
+			Downloading installation package from https://downloads.wordpress.org/plugin/wp-dummy-content-generator
+			"""
+
+	Scenario: A backend started later installs from the cache
+		When the site is started
+		And another backend is started
+		Then the log of 1 backend contains:
+			"""
+			Downloading installation package from https://downloads.wordpress.org/plugin/wp-dummy-content-generator
+			"""
+
+	Scenario: Corrupted cached packages are downloaded again and replaced
+		When the site is started
+		And the cached plugin packages are corrupted
+		And another backend is started
+		Then the logs of 2 backends contain:
+			"""
+			Downloading installation package from https://downloads.wordpress.org/plugin/wp-dummy-content-generator
+			"""
+		And the log of 1 backend contains:
+			"""
+			removed './plugin/wp-dummy-content-generator-
+			"""
@@ -0,0 +1,213 @@
+#  Copyright 2026  Dominik Sekotill <dom.sekotill@kodo.org.uk>
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Run the behaviour tests in parallel
+
+Feature files are sharded across a number of workers, each of which is a "behave" process
+with its own site fixture (network, database, backend and frontend containers).  Features
+which start sites of their own (with the step "Given the site is not running") are each run
+by a dedicated worker, so their extra sites do not hold up other features.
+
+The results of all workers are aggregated into one JSON report, in the format of behave's
+"json" formatter, and summarised on stdout.  Run from the top directory of the project:
+
+	python tests/parallel.py --workers=4 --output=report.json
+	python tests/parallel.py --workers=2 tests/regression-*.feature
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from collections.abc import Iterator
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from subprocess import DEVNULL
+from subprocess import run
+from tempfile import TemporaryDirectory
+from typing import Any
+
+from wp import BUILD_CONTEXT
+from wp import IMAGE_CACHE_VAR
+from wp import prebuild_images
+
+TESTS_DIR = Path(__file__).parent
+DEDICATED_STEP = re.compile(r"^\s*(Given|And)\s+the site is not running\s*$", re.MULTILINE)
+SCENARIO = re.compile(r"^\s*Scenario( Outline)?:", re.MULTILINE)
+
+
+@dataclass
+class Shard:
+	"""
+	A group of feature files run by a single worker
+	"""
+
+	features: list[Path] = field(default_factory=list)
+	weight: int = 0
+	dedicated: bool = False
+
+	def add(self, feature: Path, weight: int) -> None:
+		"""
+		Add a feature file to the shard
+		"""
+		self.features.append(feature)
+		self.weight += weight
+
+
+@dataclass
+class Result:
+	"""
+	The outcome of running a shard
+	"""
+
+	shard: Shard
+	returncode: int
+	log: str
+	report: list[dict[str, Any]]
+
+
+def main(argv: Sequence[str]|None = None) -> int:
+	"""
+	Run the behaviour tests in parallel and report the results
+	"""
+	parser = argparse.ArgumentParser(
+		description="Run the behaviour tests, sharded across parallel workers",
+		epilog="Unrecognised options, such as --tags, are passed on to every behave process",
+	)
+	parser.add_argument(
+		"--workers", type=int, default=os.cpu_count() or 1,
+		help="Maximum number of workers (and so sites) running at once",
+	)
+	parser.add_argument(
+		"--output", type=Path,
+		help="Write the aggregated JSON report to this file",
+	)
+	parser.add_argument(
+		"features", type=Path, nargs="*",
+		help="Feature files or directories of them to run (default: all)",
+	)
+	args, behave_args = parser.parse_known_args(argv)
+
+	features = list(find_features(args.features or [TESTS_DIR]))
+	if not features:
+		parser.error("no feature files found")
+	shards = make_shards(features, args.workers)
+
+	with TemporaryDirectory() as tdir, ThreadPoolExecutor(max_workers=args.workers) as pool:
+		# Build images once, up front, and share them with the workers
+		os.environ.setdefault(IMAGE_CACHE_VAR, str(Path(tdir) / "images.json"))
+		prebuild_images(os.environ)
+
+		jobs = [
+			pool.submit(run_shard, shard, Path(tdir) / f"shard-{num}", behave_args)
+			for num, shard in enumerate(shards)
+		]
+		results = [job.result() for job in jobs]
+
+	report = [feature for result in results for feature in result.report]
+	if args.output:
+		with args.output.open("w") as output:
+			json.dump(report, output, indent=2)
+
+	for result in results:
+		if result.returncode != 0:
+			sys.stderr.write(result.log)
+	summarise(report)
+	return max(result.returncode for result in results)
+
+
+def find_features(paths: Sequence[Path]) -> Iterator[Path]:
+	"""
+	Yield feature files from a list of files and directories
+	"""
+	for path in paths:
+		if path.is_dir():
+			yield from sorted(path.absolute().rglob("*.feature"))
+		else:
+			yield path.absolute()
+
+
+def make_shards(features: Sequence[Path], workers: int) -> list[Shard]:
+	"""
+	Group feature files into shards, balanced by their number of scenarios
+
+	Features which need dedicated sites are put in shards of their own; the remaining
+	features are divided between the workers.  The heaviest shards are sorted first so that
+	they are started first.
+	"""
+	dedicated = list[Shard]()
+	shared = [Shard() for _ in range(workers)]
+	weighted = []
+	for path in features:
+		text = path.read_text()
+		weight = len(SCENARIO.findall(text))
+		if DEDICATED_STEP.search(text):
+			dedicated.append(Shard(dedicated=True))
+			dedicated[-1].add(path, weight)
+		else:
+			weighted.append((weight, path))
+	for weight, path in sorted(weighted, key=lambda item: item[0], reverse=True):
+		min(shared, key=lambda shard: shard.weight).add(path, weight)
+	shards = dedicated + [shard for shard in shared if shard.features]
+	return sorted(shards, key=lambda shard: shard.weight, reverse=True)
+
+
+def run_shard(shard: Shard, output: Path, behave_args: Sequence[str]) -> Result:
+	"""
+	Run the feature files of a shard in a behave process
+	"""
+	report = output.with_suffix(".json")
+	cmd = [
+		sys.executable, "-m", "behave",
+		"--no-capture", "--no-color",
+		"--format=plain", f"--outfile={output.with_suffix('.log')}",
+		"--format=json", f"--outfile={report}",
+		*behave_args,
+		*(str(path) for path in shard.features),
+	]
+	logging.info("Starting worker for: %s", ", ".join(p.name for p in shard.features))
+	proc = run(cmd, stdin=DEVNULL, cwd=BUILD_CONTEXT)
+	log = output.with_suffix(".log")
+	return Result(
+		shard=shard,
+		returncode=proc.returncode,
+		log=log.read_text() if log.exists() else "",
+		report=json.loads(report.read_text() or "[]") if report.exists() else [],
+	)
+
+
+def summarise(report: list[dict[str, Any]]) -> None:
+	"""
+	Print counts of features, scenarios and steps by their status
+	"""
+	features = Counter[str]()
+	scenarios = Counter[str]()
+	steps = Counter[str]()
+	for feature in report:
+		features[feature.get("status", "untested")] += 1
+		for element in feature.get("elements", []):
+			if element.get("type") == "background":
+				continue
+			scenarios[element.get("status", "untested")] += 1
+			for step in element.get("steps", []):
+				steps[step.get("result", {}).get("status", "skipped")] += 1
+	for name, counts in [("features", features), ("scenarios", scenarios), ("steps", steps)]:
+		statuses = ", ".join(f"{num} {status}" for status, num in sorted(counts.items()))
+		sys.stdout.write(f"{sum(counts.values())} {name}: {statuses}\n")
+
+
+if __name__ == "__main__":
+	logging.basicConfig(level=logging.INFO, format="%(message)s")
+	sys.exit(main())
@@ -0,0 +1,98 @@
+#  Copyright 2026  Dominik Sekotill <dom.sekotill@kodo.org.uk>
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Keep-alive connection pools for requests to site fixtures
+
+The adapter installed by `behave_utils.http.redirect` creates a new connection pool, and so
+a new connection, for every request.  `pooled_redirect` wraps it with an adapter which keeps
+one pool of a fixed size per host, so connections are reused and limited in number.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+from collections.abc import Mapping
+from threading import Lock
+from typing import Any
+from urllib.parse import urlparse
+
+from behave_utils.http import redirect
+from requests import PreparedRequest
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool
+
+
+def pooled_redirect(
+	session: Session,
+	prefix: str,
+	address: ipaddress.IPv4Address,
+	size: int = 1,
+) -> None:
+	"""
+	Redirect all requests for "prefix" to an address, over a pool of keep-alive connections
+
+	Like `behave_utils.http.redirect`, except that no more than "size" connections to each
+	host are ever opened; when all are in use, requests wait for one to become free.
+	"""
+	redirect(session, prefix, address)
+	directed = session.get_adapter(prefix)
+	assert isinstance(directed, HTTPAdapter)
+	session.mount(prefix, _PooledAdapter(directed, size))
+
+
+class _PooledAdapter(HTTPAdapter):
+	"""
+	An HTTP adapter which keeps the connection pools created by another adapter
+	"""
+
+	def __init__(self, directed: HTTPAdapter, size: int):
+		super().__init__()
+		self.directed = directed
+		self.size = size
+		self.pools = dict[tuple[str, str|None, int|None], HTTPConnectionPool]()
+		self.lock = Lock()
+
+	def get_connection_with_tls_context(
+		self,
+		request: PreparedRequest,
+		verify: bool|str|None,
+		proxies: Mapping[str, str]|None = None,
+		cert: tuple[str, str]|str|None = None,
+	) -> HTTPConnectionPool:
+		assert request.url is not None
+		return self.get_connection(request.url, proxies)
+
+	def get_connection(
+		self,
+		url: str|bytes,
+		proxies: Mapping[str, str]|None = None,
+	) -> HTTPConnectionPool:
+		if isinstance(url, bytes):
+			url = url.decode("ascii")
+		parts = urlparse(url)
+		key = parts.scheme, parts.hostname, parts.port
+		with self.lock:
+			if key not in self.pools:
+				template = self.directed.get_connection(url, proxies)
+				assert isinstance(template, HTTPConnectionPool)
+				self.pools[key] = type(template)(
+					template.host, template.port,
+					maxsize=self.size, block=True,
+					**template.conn_kw,
+				)
+			return self.pools[key]
+
+	def cert_verify(self, *args: Any) -> None:
+		self.directed.cert_verify(*args)  # type: ignore[no-untyped-call]
+
+	def close(self) -> None:
+		with self.lock:
+			for pool in self.pools.values():
+				pool.close()
+			self.pools.clear()
+		super().close()
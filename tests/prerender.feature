@@ -0,0 +1,44 @@
+@long-running
+
+Feature: Pre-rendered pages
+	Pages listed in PRERENDER are rendered into the static directory when the
+	site starts, and served from there to anonymous visitors without running
+	PHP.
+
+	Background:
+		Given the site is not running
+		And /etc/wordpress/prerender.conf contains:
+			"""
+			PRERENDER+=( / /feed/ post )
+			PRERENDER_INTERVAL=1
+			"""
+		When the site is started
+
+	Scenario: Listed pages are pre-rendered
+		Then /app/static/wp/_prerendered/index.html exists in the backend
+		And /app/static/wp/_prerendered/feed/index.rss exists in the backend
+		And the backend log contains:
+			"""
+			Pre-rendered 3 pages, 0 failed
+			"""
+
+	Scenario: Posts of listed post types are pre-rendered and served
+		Then /app/static/wp/_prerendered/posts/hello-world.html exists in the backend
+		When /posts/hello-world is requested
+		Then OK is returned
+		And the "Cache-Control" header's value is "public, no-cache"
+
+	Scenario: Pages are kept when they are rendered again in the background
+		When 40 seconds have passed
+		Then /app/static/wp/_prerendered/index.html exists in the backend
+		And /app/static/wp/_prerendered/feed/index.rss exists in the backend
+		And /app/static/wp/_prerendered/posts/hello-world.html exists in the backend
+
+	Scenario: Pre-rendered pages are served with revalidation
+		When / is requested
+		Then OK is returned
+		And the "Cache-Control" header's value is "public, no-cache"
+
+	Scenario: The pre-rendered directory cannot be requested directly
+		When /_prerendered/index.html is requested
+		Then Not Found is returned
@@ -0,0 +1,30 @@
+Feature: Request rate limits
+	Expensive endpoints are rate limited per client, so that floods of requests
+	are refused instead of using up every PHP worker while other visitors wait.
+
+	Background:
+		Given the site is not running
+		When the site is started
+
+	Scenario: Searches in excess of the burst are refused
+		When /?s=lorem is requested 40 times with 1 concurrent clients
+		Then some responses are Too Many Requests
+
+	Scenario: Login attempts in excess of the burst are refused
+		When data is sent with POST to /wp-login.php 30 times with 1 concurrent clients
+			"""
+			log=admin&pwd=incorrect
+			"""
+		Then some responses are Too Many Requests
+
+	Scenario: XML-RPC requests in excess of the burst are refused
+		When data is sent with POST to /xmlrpc.php 20 times with 1 concurrent clients
+			"""
+			<?xml version="1.0"?>
+			<methodCall><methodName>system.listMethods</methodName></methodCall>
+			"""
+		Then some responses are Too Many Requests
+
+	Scenario: Page views are not rate limited
+		When the homepage is requested 40 times with 4 concurrent clients
+		Then every response is OK
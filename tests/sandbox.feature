@@ -0,0 +1,16 @@
+@long-running
+
+Feature: Sandbox mode
+	In sandbox mode extensions are copied into the static volume, where the
+	worker user may change them; the installed extensions are not changed.
+
+	Background:
+		Given the site is not running
+		And plugins.conf is mounted in /etc/wordpress/
+		And the environment variable SANDBOX_MODE is "true"
+		When the site is started
+
+	Scenario: Changes to a plugin in the sandbox do not reach the installed plugin
+		When the worker user appends "changed in the sandbox" to /app/static/wp-content/plugins/wp-dummy-content-generator/readme.txt
+		Then /app/static/wp-content/plugins/wp-dummy-content-generator/readme.txt in the backend contains "changed in the sandbox"
+		And /app/wp-content/plugins/wp-dummy-content-generator/readme.txt in the backend does not contain "changed in the sandbox"
@@ -0,0 +1,18 @@
+@long-running
+
+Feature: Large sites
+	Sites with large amounts of content should continue to serve pages
+	successfully.
+
+	Background: Content is generated
+		Given the site has 20000 posts
+		And the site has 5000 media items
+		And the site has 100000 postmeta rows
+
+	Scenario: Homepage post index
+		When the homepage is requested
+		Then OK is returned
+
+	Scenario: REST API post listing
+		When /wp-json/wp/v2/posts is requested
+		Then OK is returned
@@ -0,0 +1,41 @@
+@long-running
+
+Feature: Setup lock
+	Backends sharing a database make changes to it one at a time while starting,
+	holding the "wordpress-setup" lock, so when several start together only one
+	of them installs and upgrades the site.
+
+	Background:
+		Given the site is not running
+
+	Scenario: Backends starting together set up the database once
+		Given the site has 2 backends
+		When the site is started
+		Then the log of 1 backend contains:
+			"""
+			WordPress installed successfully
+			"""
+		And the log of 1 backend contains:
+			"""
+			Database already prepared for the installed components
+			"""
+
+	Scenario: A backend exits if the lock is not taken in time
+		Given the environment variable DB_LOCK_TIMEOUT is "2"
+		And the wordpress-setup lock is held
+		When the backend is started
+		Then the backend exits with an error
+		And the backend log contains:
+			"""
+			Timed out waiting for the wordpress-setup lock
+			"""
+
+	Scenario: A backend exits if taking the lock fails
+		Given the wordpress-setup lock is held
+		When the backend is started
+		And the backend's wait for the wordpress-setup lock is interrupted
+		Then the backend exits with an error
+		And the backend log contains:
+			"""
+			Failed to take the wordpress-setup lock: error
+			"""
@@ -0,0 +1,34 @@
+Feature: Stale pages
+	Copies of responses to anonymous visitors are kept, to be served if
+	PHP-FPM fails or is overloaded.  Whether a response came from a copy is
+	shown in a header and in the metrics.
+
+	Scenario: Responses to anonymous visitors are kept
+		When /?stale-cache-test=1 is requested
+		Then OK is returned
+		And the "X-Cache-Status" header's value is "MISS"
+
+	Scenario: Cache statuses are counted in the metrics
+		When /?stale-cache-test=2 is requested
+		And the metrics are requested
+		Then OK is returned
+		And the response body contains:
+			"""
+			nginx_cache_requests_total{status="miss"}
+			"""
+
+	Scenario: Responses are kept separately for requests forwarded from HTTPS
+		When /?stale-cache-test=3 is requested
+		And /?stale-cache-test=3 is requested with the header "X-Forwarded-Proto: https"
+		Then OK is returned
+		And the "X-Cache-Status" header's value is "MISS"
+
+	@long-running
+	Scenario: Kept responses are served when PHP-FPM fails
+		Given the site is not running
+		And make-unavailable.php is mounted in /etc/wordpress/ as unavailable-config.php
+		When /?stale-cache-test=4 is requested
+		And 2 seconds have passed
+		And /?stale-cache-test=4 is requested with the header "X-Test-Unavailable: 1"
+		Then OK is returned
+		And the "X-Cache-Status" header's value is "STALE"
@@ -12,6 +12,7 @@ from __future__ import annotations
 
 import json
 import shlex
+from time import sleep
 from typing import TYPE_CHECKING
 
 from behave import then
@@ -93,3 +94,39 @@ def check_stream(context: Context, response: str, stream: Stream) -> None:
 	output = getattr(context.process, stream.value)
 	assert output.strip() == response.encode(), \
 		f"Expected output from {stream.name}: {response.encode()!r}\ngot: {output!r}"
+
+
+@then("the command succeeds")
+def check_success(context: Context) -> None:
+	"""
+	Check a previous command exited with a zero status
+	"""
+	process = context.process
+	assert process.returncode == 0, \
+		f"Command failed with status {process.returncode}: {process.stderr!r}"
+
+
+@then("the command fails")
+def check_failure(context: Context) -> None:
+	"""
+	Check a previous command exited with a non-zero status
+	"""
+	assert context.process.returncode != 0, \
+		f"Command unexpectedly succeeded: {context.process.stdout!r}"
+
+
+@when("the backend's cron runner is stopped")
+def stop_cron_runner(context: Context) -> None:
+	"""
+	Stop the cron runner in the backend, as for a Kubernetes "preStop" hook
+	"""
+	site = use_fixture(running_site_fixture, context)
+	site.backend.run(["/bin/entrypoint", "drain"], check=True)
+
+
+@when("{seconds:d} seconds have passed")
+def wait_seconds(context: Context, seconds: int) -> None:
+	"""
+	Pause for a number of seconds, for instance to let a time limit expire
+	"""
+	sleep(seconds)
@@ -0,0 +1,100 @@
+#  Copyright 2026  Dominik Sekotill <dom.sekotill@kodo.org.uk>
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Step implementations involving the logs of site containers
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from behave import then
+from behave import use_fixture
+from behave.runner import Context
+from behave_utils.utils import wait
+from wp import read_logs
+from wp import running_site_fixture
+from wp import site_fixture
+
+LOG_TIMEOUT = 10.0
+
+
+@then("the {container_name} log contains")
+def check_log(context: Context, container_name: str) -> None:
+	"""
+	Check the step's text is output by the named container, waiting for it to be written
+	"""
+	if context.text is None:
+		raise ValueError("A text value is needed for this step")
+	site = use_fixture(site_fixture, context)
+	container = getattr(site, container_name)
+	expected = context.text.strip().encode()
+	try:
+		wait(lambda: expected in read_logs(container), timeout=LOG_TIMEOUT)
+	except TimeoutError:
+		raise AssertionError(f"{expected!r} not seen in the {container_name} log") from None
+
+
+@then("the log of {count:d} backend contains")
+@then("the logs of {count:d} backends contain")
+def check_backend_logs(context: Context, count: int) -> None:
+	"""
+	Check the step's text is output by exactly a number of the site's backends
+	"""
+	if context.text is None:
+		raise ValueError("A text value is needed for this step")
+	site = use_fixture(site_fixture, context)
+	expected = context.text.strip().encode()
+	matched = list[int]()
+
+	def found() -> bool:
+		matched[:] = [
+			index for index, backend in enumerate(site.backends)
+			if expected in read_logs(backend)
+		]
+		return len(matched) >= count
+
+	try:
+		wait(found, timeout=LOG_TIMEOUT)
+	except TimeoutError:
+		pass
+	assert len(matched) == count, \
+		f"{expected!r} seen in the logs of {len(matched)} of {len(site.backends)} " \
+		f"backends, expected {count}"
+
+
+@then("the frontend logs the request as JSON with the fields")
+def check_json_access_log(context: Context) -> None:
+	"""
+	Check the frontend's access log line for the request of a previous step is a JSON object
+
+	The line is identified by the request's "X-Request-ID" header, and must have at least
+	the fields listed in the step's table.
+	"""
+	if context.table is None:
+		raise ValueError("A table of field names is needed for this step")
+	site = use_fixture(running_site_fixture, context)
+	request_id = context.response.request.headers["X-Request-ID"]
+	entries = list[dict[str, Any]]()
+
+	def logged() -> bool:
+		for line in read_logs(site.frontend).splitlines():
+			if request_id.encode() in line:
+				entries.append(json.loads(line))
+				return True
+		return False
+
+	try:
+		wait(logged, timeout=LOG_TIMEOUT)
+	except TimeoutError:
+		raise AssertionError(f"Request {request_id} not seen in the access log") from None
+	entry = entries[0]
+	assert entry["request_id"] == request_id, f"Unexpected request ID in {entry}"
+	fields = [row[0] for row in context.table]
+	missing = [name for name in fields if name not in entry]
+	assert not missing, f"Fields missing from the access log: {', '.join(missing)}"
@@ -10,7 +10,14 @@ Step implementations involving creating and requesting WP posts (and pages)
 
 from __future__ import annotations
 
+import gzip
+import json
+import logging
 from codecs import decode as utf8_decode
+from hashlib import sha256
+from os import environ
+from pathlib import Path
+from time import perf_counter
 from typing import Iterator
 
 from behave import fixture
@@ -24,6 +31,7 @@ from behave_utils import JSONArray
 from behave_utils import JSONObject
 from behave_utils import PatternEnum
 from request_steps import get_request
+from wp import Site
 from wp import running_site_fixture
 
 DEFAULT_CONTENT = """
@@ -34,6 +42,11 @@ voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur sint occa
 cupidatat non proident, sunt in culpa qui officia deserunt mollit anim id est laborum.
 """
 
+SEED_SCRIPT = Path(__file__).parent.parent / "configs" / "seed-content.php"
+SEED_TABLES = ["posts", "postmeta", "terms", "term_taxonomy", "term_relationships"]
+SEED_CACHE = Path(environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "wp-behave-seeds"
+DEFAULT_SEED = 1
+
 
 class PostType(PatternEnum):
 	"""
@@ -68,6 +81,30 @@ def create_post(context: Context, post_type: PostType, text: str|None = None) ->
 	setattr(context, post_type.value, post)
 
 
+@given("the site has {count:d} posts")
+def seed_posts(context: Context, count: int) -> None:
+	"""
+	Generate published posts until there are the given number
+	"""
+	use_fixture(seeded_content, context, "posts", count)
+
+
+@given("the site has {count:d} media items")
+def seed_media(context: Context, count: int) -> None:
+	"""
+	Generate media items (attachments) until there are the given number
+	"""
+	use_fixture(seeded_content, context, "media", count)
+
+
+@given("the site has {count:d} postmeta rows")
+def seed_postmeta(context: Context, count: int) -> None:
+	"""
+	Generate post metadata until there are the given number of rows
+	"""
+	use_fixture(seeded_content, context, "postmeta", count)
+
+
 @given("the page is configured as the homepage")
 def set_homepage(context: Context) -> None:
 	"""
@@ -120,6 +157,25 @@ def assert_contains(
 	assert text in context.response.text
 
 
+@then("the image {name} has no intermediate sizes")
+def assert_no_image_sizes(context: Context, name: str) -> None:
+	"""
+	Assert that none of the intermediate sizes of the named image have been generated
+	"""
+	site = use_fixture(running_site_fixture, context)
+	sizes = _get_image_sizes(site, name)
+	assert not sizes, f"{name} has intermediate sizes: {', '.join(sizes)}"
+
+
+@then("the image {name} has intermediate sizes")
+def assert_image_sizes(context: Context, name: str) -> None:
+	"""
+	Assert that intermediate sizes of the named image have been generated
+	"""
+	site = use_fixture(running_site_fixture, context)
+	assert _get_image_sizes(site, name), f"{name} has no intermediate sizes"
+
+
 @fixture
 def wp_post(
 	context: Context, /,
@@ -152,6 +208,52 @@ def wp_post(
 	wp.cli("post", "delete", postid)
 
 
+@fixture
+def seeded_content(
+	context: Context, /,
+	kind: str,
+	total: int,
+	seed: int = DEFAULT_SEED,
+) -> Iterator[None]:
+	"""
+	Generate content of a kind until there is the given total, as a fixture
+
+	Content is generated deterministically by configs/seed-content.php, in a single PHP
+	process.  Afterwards the content tables are cached as a snapshot, keyed by the script's
+	inputs and the tables' checksums beforehand; requesting the same content again restores
+	the snapshot instead of generating it.
+
+	Generated content is not deleted at the end of a scenario, it is reverted with other
+	changes to the database at the end of a feature.
+	"""
+	site = use_fixture(running_site_fixture, context)
+	prefix = site.backend.cli("db", "prefix", deserialiser=utf8_decode).strip()
+	tables = [prefix + name for name in SEED_TABLES]
+	checksums = site.database.mysql(
+		"--skip-column-names", f"--execute=CHECKSUM TABLE {', '.join(tables)}",
+		deserialiser=lambda mv: [line.split()[-1] for line in str(mv, "utf-8").splitlines()],
+	)
+	script = SEED_SCRIPT.read_bytes()
+	key = json.dumps([kind, total, seed, checksums, sha256(script).hexdigest()])
+	snapshot = SEED_CACHE / f"{sha256(key.encode()).hexdigest()}.sql.gz"
+
+	start = perf_counter()
+	cached = snapshot.exists()
+	if cached:
+		site.database.mysql(input=gzip.decompress(snapshot.read_bytes()))
+	else:
+		site.backend.cli("eval-file", "-", kind, str(total), str(seed), input=script)
+		SEED_CACHE.mkdir(parents=True, exist_ok=True)
+		temp = snapshot.with_suffix(".tmp")
+		temp.write_bytes(gzip.compress(site.database.mysqldump(*tables, deserialiser=bytes)))
+		temp.replace(snapshot)
+	logging.info(
+		"Seeded %d %s in %.2fs%s", total, kind, perf_counter() - start,
+		" (from snapshot)" if cached else "",
+	)
+	yield
+
+
 @fixture
 def set_specials(
 	context: Context, /,
@@ -184,3 +286,17 @@ def set_specials(
 			wp.cli("option", "update", name, options[name])
 		except KeyError:
 			wp.cli("option", "delete", name)
+
+
+def _get_image_sizes(site: Site, name: str) -> list[str]:
+	ids = site.backend.cli(
+		"post", "list", "--post_type=attachment", "--post_status=inherit",
+		f"--name={name}", "--field=ID", "--format=json",
+		deserialiser=JSONArray.from_string,
+	)
+	assert ids, f"no image named {name}"
+	metadata = site.backend.cli(
+		"post", "meta", "get", str(ids[0]), "_wp_attachment_metadata", "--format=json",
+		deserialiser=JSONObject.from_string,
+	)
+	return list(metadata.get("sizes") or [])
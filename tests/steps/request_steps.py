@@ -12,10 +12,17 @@ from __future__ import annotations
 
 import json
 from collections.abc import Collection
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from math import ceil
 from textwrap import dedent
+from threading import Event
+from time import perf_counter
+from time import sleep
 from typing import Any
 from typing import Iterator
 from typing import TypeVar
+from urllib.parse import urlparse
 
 from behave import fixture
 from behave import then
@@ -25,7 +32,10 @@ from behave.runner import Context
 from behave_utils import URL
 from behave_utils import PatternEnum
 from behave_utils.http import redirect
+from memory import MEMORY_USAGE
+from pooling import pooled_redirect
 from requests import Session
+from requests.exceptions import ConnectionError
 from wp import running_site_fixture
 
 T = TypeVar("T")
@@ -37,6 +47,8 @@ except ImportError:
 		return obj
 
 SAMPLE_SITE_NAME = "http://test.example.com"
+METRICS_PORT = 9113
+SHUTDOWN_CLIENTS = 4
 
 
 class Method(PatternEnum):
@@ -63,12 +75,14 @@ class ResponseCode(int, PatternEnum):
 	permanent_redirect = 308
 	not_found = 404
 	method_not_allowed = 405
+	too_many_requests = 429
 
 	# Aliases for the above codes, for mapping natural language in feature files to enums
 	ALIASES = nonmember({
 		"OK": 200,
 		"Not Found": 404,
 		"Method Not Allowed": 405,
+		"Too Many Requests": 429,
 	})
 
 	@staticmethod
@@ -94,6 +108,17 @@ class ResponseCode(int, PatternEnum):
 		attr.update(additional)
 
 
+@dataclass
+class Timing:
+	"""
+	The status code and duration (in seconds) of a request made by a load step
+	"""
+
+	url: URL
+	status: int
+	elapsed: float
+
+
 @fixture
 def requests_session(context: Context, /) -> Iterator[Session]:
 	"""
@@ -109,6 +134,20 @@ def requests_session(context: Context, /) -> Iterator[Session]:
 		yield context.session
 
 
+@fixture
+def pooled_session(context: Context, /, size: int) -> Iterator[Session]:
+	"""
+	Create a `requests` session for concurrent use, with a pool of keep-alive connections
+
+	The session may be shared between threads; each will wait for a free connection in the
+	pool, so no more than "size" connections are ever opened.
+	"""
+	site = use_fixture(running_site_fixture, context)
+	with Session() as session:
+		pooled_redirect(session, site.url, site.address, size)
+		yield session
+
+
 @when("{url:URL} is requested")
 def get_request(context: Context, url: URL) -> None:
 	"""
@@ -116,7 +155,20 @@ def get_request(context: Context, url: URL) -> None:
 	"""
 	site = use_fixture(running_site_fixture, context)
 	session = use_fixture(requests_session, context)
-	context.response = session.get(site.url / url, allow_redirects=False)
+	headers = MEMORY_USAGE.tag_request(site.backend, url)
+	context.response = session.get(site.url / url, headers=headers, allow_redirects=False)
+
+
+@when('{url:URL} is requested with the header "{name}: {value}"')
+def get_request_with_header(context: Context, url: URL, name: str, value: str) -> None:
+	"""
+	Assign the response from making a GET request with an extra header to the context
+	"""
+	site = use_fixture(running_site_fixture, context)
+	session = use_fixture(requests_session, context)
+	headers = MEMORY_USAGE.tag_request(site.backend, url)
+	headers[name] = value
+	context.response = session.get(site.url / url, headers=headers, allow_redirects=False)
 
 
 @when("data is sent with {method:Method} to {url:URL}")
@@ -132,6 +184,7 @@ def post_request(context: Context, method: Method, url: URL) -> None:
 		method.value,
 		site.url / url,
 		data=context.text.strip().format(context=context).encode("utf-8"),
+		headers=MEMORY_USAGE.tag_request(site.backend, url),
 		allow_redirects=False,
 	)
 
@@ -144,6 +197,207 @@ def get_homepage(context: Context) -> None:
 	get_request(context, '/')
 
 
+@when("{url:URL} is requested {count:d} times with {clients:d} concurrent clients")
+def load_request(
+	context: Context,
+	url: URL,
+	count: int,
+	clients: int,
+	method: Method = Method.GET,
+	data: bytes|None = None,
+) -> None:
+	"""
+	Request a URL repeatedly from concurrent clients sharing a pool of connections
+
+	The status codes and durations of every request are assigned to the context as
+	"status_codes" and "timings".
+	"""
+	site = use_fixture(running_site_fixture, context)
+	session = use_fixture(pooled_session, context, clients)
+	target = site.url / url
+
+	def request(_: int) -> Timing:
+		headers = MEMORY_USAGE.tag_request(site.backend, url)
+		start = perf_counter()
+		response = session.request(
+			method.value, target, data=data, headers=headers, allow_redirects=False,
+		)
+		return Timing(url, response.status_code, perf_counter() - start)
+
+	with ThreadPoolExecutor(max_workers=clients) as executor:
+		context.timings = list(executor.map(request, range(count)))
+	context.status_codes = [timing.status for timing in context.timings]
+
+
+@when(
+	"data is sent with {method:Method} to {url:URL} {count:d} times"
+	" with {clients:d} concurrent clients",
+)
+def load_post_request(
+	context: Context,
+	method: Method,
+	url: URL,
+	count: int,
+	clients: int,
+) -> None:
+	"""
+	Send context text to a URL endpoint repeatedly from concurrent clients
+
+	The results are assigned to the context as for `load_request`.
+	"""
+	if context.text is None:
+		raise ValueError("Missing data, please add as text to step definition")
+	data = context.text.strip().format(context=context).encode("utf-8")
+	load_request(context, url, count, clients, method, data)
+
+
+@when("the homepage is requested {count:d} times with {clients:d} concurrent clients")
+def load_homepage(context: Context, count: int, clients: int) -> None:
+	"""
+	Request the homepage repeatedly from concurrent clients
+	"""
+	load_request(context, URL("/"), count, clients)
+
+
+@when("the metrics are requested")
+def get_metrics(context: Context) -> None:
+	"""
+	Assign the response from requesting the metrics port of the frontend to the context
+	"""
+	site = use_fixture(running_site_fixture, context)
+	host = urlparse(site.url).hostname
+	get_request(context, URL(f"//{host}:{METRICS_PORT}/metrics"))
+
+
+@when("the homepage is requested continuously while the site is shut down")
+def request_during_shutdown(context: Context) -> None:
+	"""
+	Request the homepage from concurrent clients while the site is gracefully shut down
+
+	Like a load balancer, clients stop sending requests once the frontend's health check
+	reports it is unready; requests sent before then must not fail.  The status codes of all
+	responses are assigned to the context as "status_codes", and the number of failed
+	connections as "connection_errors".
+	"""
+	site = use_fixture(running_site_fixture, context)
+	address = site.address
+	unready = Event()
+	codes = list[int]()
+	errors = list[ConnectionError]()
+
+	def client() -> None:
+		with Session() as session:
+			redirect(session, site.url, address)
+			while not unready.is_set():
+				try:
+					codes.append(session.get(site.url, allow_redirects=False).status_code)
+				except ConnectionError as error:
+					errors.append(error)
+
+	def health_check() -> None:
+		# As for a Kubernetes readiness probe, a refused connection also means unready
+		with Session() as session:
+			redirect(session, site.url, address)
+			while not unready.is_set():
+				try:
+					ready = session.get(site.url / "/.probe").status_code == 200
+				except ConnectionError:
+					ready = False
+				if not ready:
+					unready.set()
+				sleep(0.2)
+
+	with ThreadPoolExecutor(max_workers=SHUTDOWN_CLIENTS + 1) as executor:
+		clients = [executor.submit(client) for _ in range(SHUTDOWN_CLIENTS)]
+		clients.append(executor.submit(health_check))
+		sleep(1.0)
+		try:
+			site.shutdown()
+		finally:
+			unready.set()
+		for future in clients:
+			future.result()
+	context.status_codes = codes
+	context.connection_errors = len(errors)
+
+
+@then("no server errors were returned")
+def assert_no_server_errors(context: Context) -> None:
+	"""
+	Assert no 5xx status codes or failed connections were recorded by a previous step
+	"""
+	codes: list[int] = context.status_codes
+	assert codes, "No responses were received"
+	errors = [code for code in codes if code >= 500]
+	assert not errors, f"{len(errors)} of {len(codes)} responses were server errors"
+	failed = getattr(context, "connection_errors", 0)
+	assert not failed, f"{failed} connections failed"
+
+
+@then("every response is {response:ResponseCode}")
+def assert_responses(context: Context, response: ResponseCode) -> None:
+	"""
+	Assert that all the status codes recorded by a previous step are the expected code
+	"""
+	codes: list[int] = context.status_codes
+	unexpected = [code for code in codes if code != response]
+	assert not unexpected, \
+		f"{len(unexpected)} of {len(codes)} responses were not {response}: " \
+		f"got {sorted(set(unexpected))}"
+
+
+@then("some responses are {response:ResponseCode}")
+def assert_some_responses(context: Context, response: ResponseCode) -> None:
+	"""
+	Assert that at least one of the status codes recorded by a previous step is a code
+	"""
+	codes: list[int] = context.status_codes
+	assert response in codes, \
+		f"None of {len(codes)} responses were {response}: got {sorted(set(codes))}"
+
+
+@then("{percent:d}% of responses complete within {limit:d} ms")
+def assert_latency(context: Context, percent: int, limit: int) -> None:
+	"""
+	Assert that a percentile of the request durations recorded by a previous step is within
+	a limit
+	"""
+	timings: list[Timing] = context.timings
+	assert timings, "No requests were timed"
+	durations = sorted(timing.elapsed * 1000 for timing in timings)
+	value = durations[max(ceil(len(durations) * percent / 100) - 1, 0)]
+	assert value <= limit, \
+		f"{percent}th percentile of {len(durations)} responses is {value:.0f} ms; " \
+		f"exceeds {limit} ms"
+
+
+@then("the request used no more than {limit:d} MiB of PHP memory")
+def assert_memory(context: Context, limit: int) -> None:
+	"""
+	Assert that the peak PHP memory used by the request of a previous step is within a limit
+	"""
+	request_id = context.response.request.headers["X-Request-ID"]
+	cache_status = context.response.headers.get("X-Cache-Status")
+	if cache_status in ("HIT", "STALE", "UPDATING"):
+		raise AssertionError(
+			f"Request for {context.response.request.path_url} was served from the frontend's "
+			f"cache ({cache_status}) so never reached PHP; its memory usage is unknown",
+		)
+	kib = MEMORY_USAGE.get(request_id)
+	assert kib <= limit * 1024, \
+		f"Request for {context.response.request.path_url} used {kib / 1024:.1f} MiB; " \
+		f"exceeds {limit} MiB"
+
+
+@then("{url:URL} uses no more than {limit:d} MiB of PHP memory")
+def assert_url_memory(context: Context, url: URL, limit: int) -> None:
+	"""
+	Request a URL and assert that the peak PHP memory used is within a limit
+	"""
+	get_request(context, url)
+	assert_memory(context, limit)
+
+
 @then('"{response:ResponseCode}" is returned')
 @then('{response:ResponseCode} is returned')
 def assert_response(context: Context, response: ResponseCode) -> None:
@@ -192,3 +446,16 @@ def assert_body_contains(context: Context) -> None:
 	text = dedent(context.text).encode("utf-8")
 	assert text in context.response.content, \
 		f"text not found in {context.response.content[:100]}"
+
+
+@then("the metric {metric} is greater than zero")
+def assert_metric_nonzero(context: Context, metric: str) -> None:
+	"""
+	Assert a sample in a Prometheus text format response of a previous step is positive
+	"""
+	for line in context.response.text.splitlines():
+		name, _, value = line.rpartition(" ")
+		if name == metric:
+			assert float(value) > 0, f"{metric} is {value}"
+			return
+	raise AssertionError(f"{metric} not found in the response")
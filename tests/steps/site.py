@@ -25,14 +25,30 @@ from behave.runner import Context
 from behave_utils.behave import PatternEnum
 from behave_utils.docker import Cli
 from behave_utils.docker import Container
+from behave_utils.docker import inspect
 from behave_utils.url import URL
+from behave_utils.utils import wait
+from database import held_lock
+from database import kill_lock_waits
 from wp import CURRENT_SITE
 from wp import Site
+from wp import Wordpress
+from wp import bake_image
 from wp import running_site_fixture
 from wp import site_fixture
 
 CONFIG_DIR = Path(__file__).parent.parent / "configs"
 DELAYED_SITE = URL("http://delayed.example.com")
+EXIT_TIMEOUT = 120
+WORKER_USER = "www-data"
+PACKAGE_CACHE = Path("/var/cache/wp-packages")
+
+# Replaces the backend's /etc/hosts, making the wordpress.org hosts unreachable
+BLOCKED_HOSTS = b"""\
+127.0.0.1	localhost
+::1	localhost
+127.0.0.1	wordpress.org api.wordpress.org downloads.wordpress.org
+"""
 
 
 class Addon(PatternEnum):
@@ -118,6 +134,26 @@ def container_dir(
 		yield
 
 
+@fixture
+def started_backend(context: Context, /, site: Site) -> Iterator[Wordpress]:
+	"""
+	Start the backend of a site without waiting for it to be ready, as a fixture
+	"""
+	with site.backend.started(wait=False) as backend:
+		yield backend
+
+
+@fixture
+def added_backend(context: Context, /, site: Site) -> Iterator[Wordpress]:
+	"""
+	Add a backend to a running site, started and ready, as a fixture
+	"""
+	backend = site.add_backend()
+	with backend.started():
+		yield backend
+	site.replicas.remove(backend)
+
+
 @contextmanager
 def _container_dir_cmds(cmd_runner: Cli, path: Path) -> Iterator[None]:
 	if 0 == cmd_runner("sh", "-c", f"test -d {path}", query=True):
@@ -200,6 +236,89 @@ def set_environment(context: Context, name: str, value: str) -> None:
 	site.backend.env[name] = value
 
 
+@given("the frontend environment variable {name} is \"{value}\"")
+def set_frontend_environment(context: Context, name: str, value: str) -> None:
+	"""
+	Set the named environment variable in the frontend
+	"""
+	site = use_fixture(unstarted_site_fixture, context, CURRENT_SITE)
+	# The environment may be a default shared with other containers, so is replaced
+	site.frontend.env = {**site.frontend.env, name: value}
+
+
+@given("the backend is limited to {cpus:d} CPU")
+@given("the backend is limited to {cpus:d} CPUs")
+def limit_backend_cpus(context: Context, cpus: int) -> None:
+	"""
+	Set a CPU quota on the backends of an unstarted site
+	"""
+	site = use_fixture(unstarted_site_fixture, context, CURRENT_SITE)
+	for backend in site.backends:
+		backend.cpus = cpus
+
+
+@given("the backend image is baked with {fixture:Path}")
+def bake_backend(context: Context, fixture: Path) -> None:
+	"""
+	Replace the backend's image with a child image with the configured components baked in
+	"""
+	fixture = CONFIG_DIR / fixture
+	if not fixture.is_file():
+		raise FileNotFoundError(fixture)
+	site = use_fixture(unstarted_site_fixture, context, CURRENT_SITE)
+	site.backend.image = bake_image(site.backend.image, fixture)
+
+
+@given("the backend cannot reach wordpress.org")
+def block_wordpress_org(context: Context) -> None:
+	"""
+	Make the hosts of the wordpress.org registry unreachable from the backend
+	"""
+	site = use_fixture(unstarted_site_fixture, context, CURRENT_SITE)
+	use_fixture(container_file, context, site.backend, Path("/etc/hosts"), BLOCKED_HOSTS)
+
+
+@given("the site has {count:d} backends")
+def add_backends(context: Context, count: int) -> None:
+	"""
+	Add replicas of the backend to an unstarted site, to be started with it
+	"""
+	site = use_fixture(unstarted_site_fixture, context, CURRENT_SITE)
+	while len(site.backends) < count:
+		site.add_backend()
+
+
+@given("the {name} lock is held")
+def hold_lock(context: Context, name: str) -> None:
+	"""
+	Hold a named database lock used by the backends while starting
+	"""
+	site = use_fixture(unstarted_site_fixture, context, CURRENT_SITE)
+	use_fixture(held_lock, context, site.database, name)
+
+
+@given("the backends share a package cache")
+def share_package_cache(context: Context) -> None:
+	"""
+	Configure the backends of an unstarted site with a PACKAGE_CACHE volume
+	"""
+	site = use_fixture(unstarted_site_fixture, context, CURRENT_SITE)
+	site.backend.add_volume("packages", PACKAGE_CACHE)
+	site.backend.env["PACKAGE_CACHE"] = str(PACKAGE_CACHE)
+
+
+@when("the cached {addon:Addon} packages are corrupted")
+def corrupt_package_cache(context: Context, addon: Addon) -> None:
+	"""
+	Append junk to the cached packages of a type of addon, so they fail their checksums
+	"""
+	site = use_fixture(running_site_fixture, context, CURRENT_SITE)
+	site.backend.run(
+		["sh", "-c", f'for p in {PACKAGE_CACHE}/{addon.value}/*; do echo junk >>"$p"; done'],
+		check=True,
+	)
+
+
 @when("the site is started")
 def start_backend(context: Context) -> None:
 	"""
@@ -208,6 +327,62 @@ def start_backend(context: Context) -> None:
 	use_fixture(running_site_fixture, context, CURRENT_SITE)
 
 
+@when("another backend is started")
+def start_another_backend(context: Context) -> None:
+	"""
+	Add a backend to the running site and start it
+	"""
+	site = use_fixture(running_site_fixture, context, CURRENT_SITE)
+	use_fixture(added_backend, context, site)
+
+
+@when("the backend is started")
+def start_backend_only(context: Context) -> None:
+	"""
+	Start the site backend without waiting for it to be ready
+	"""
+	site = use_fixture(site_fixture, context, CURRENT_SITE)
+	use_fixture(started_backend, context, site)
+
+
+@when("the backend's wait for the {name} lock is interrupted")
+def interrupt_lock_wait(context: Context, name: str) -> None:
+	"""
+	Kill the backend's query waiting for a named database lock, once it is waiting
+	"""
+	site = use_fixture(site_fixture, context, CURRENT_SITE)
+	try:
+		wait(lambda: kill_lock_waits(site.database, name) > 0, timeout=EXIT_TIMEOUT)
+	except TimeoutError:
+		raise AssertionError(f"the backend did not wait for the {name} lock") from None
+
+
+@then("the backend exits with an error")
+def check_backend_exits(context: Context) -> None:
+	"""
+	Check that the backend exits, with a non-zero status
+	"""
+	site = use_fixture(site_fixture, context, CURRENT_SITE)
+	try:
+		wait(lambda: not site.backend.is_running(), timeout=EXIT_TIMEOUT)
+	except TimeoutError:
+		raise AssertionError("the backend is still running") from None
+	code = inspect(site.backend).path("$.State.ExitCode", int)
+	assert code != 0, "the backend exited successfully"
+
+
+@when('the worker user appends "{text}" to {path:Path}')
+def append_as_worker(context: Context, text: str, path: Path) -> None:
+	"""
+	Append a line to a file in the backend as the user PHP-FPM's workers run as
+	"""
+	site = use_fixture(running_site_fixture, context, CURRENT_SITE)
+	site.backend.run(
+		["su", "-s", "/bin/sh", WORKER_USER, "-c", 'echo "$1" >>"$2"', "-", text, path],
+		check=True,
+	)
+
+
 @then("the {addon:Addon} {name} is installed")
 @then("the {addon:Addon} {name} is {status:Status}")
 def is_plugin_installed(
@@ -226,6 +401,16 @@ def is_plugin_installed(
 		assert site.backend.cli(addon.value, "is-active", name, query=True) == status.value
 
 
+@then("the language {code} is installed")
+def is_language_installed(context: Context, code: str) -> None:
+	"""
+	Check that the core translation for a language is installed
+	"""
+	site = use_fixture(site_fixture, context, CURRENT_SITE)
+	assert site.backend.cli("language", "core", "is-installed", code, query=True) == 0, \
+		f"language {code} is not installed"
+
+
 @then("{path:Path} exists in the {container_name}")
 def check_file_exists(context: Context, path: Path, container_name: str) -> None:
 	"""
@@ -237,6 +422,38 @@ def check_file_exists(context: Context, path: Path, container_name: str) -> None
 		f"{path} not found in the {container_name}"
 
 
+@then('{path:Path} in the {container_name} contains "{text}"')
+def check_file_contains(
+	context: Context,
+	path: Path,
+	container_name: str,
+	text: str,
+) -> None:
+	"""
+	Check a file in the named container contains some text
+	"""
+	site = use_fixture(site_fixture, context)
+	container = getattr(site, container_name)
+	content = container.run(["cat", path], capture_output=True, check=True).stdout
+	assert text.encode() in content, f"{text!r} not found in {path}"
+
+
+@then('{path:Path} in the {container_name} does not contain "{text}"')
+def check_file_not_contains(
+	context: Context,
+	path: Path,
+	container_name: str,
+	text: str,
+) -> None:
+	"""
+	Check a file in the named container does not contain some text
+	"""
+	site = use_fixture(site_fixture, context)
+	container = getattr(site, container_name)
+	content = container.run(["cat", path], capture_output=True, check=True).stdout
+	assert text.encode() not in content, f"{text!r} found in {path}"
+
+
 @then("the email address of {user} is \"{value}\"")
 @then("the email address of {user} is '{value}'")
 def is_user_email(context: Context, user: str, value: str) -> None:
@@ -0,0 +1,36 @@
+@long-running
+
+Feature: PHP-FPM upstream
+	The frontend passes requests to every PHP-FPM backend found by resolving
+	the host names in FASTCGI_BACKENDS, either once at startup or periodically
+	with FASTCGI_RESOLVER.
+
+	Background:
+		Given the site is not running
+		And the site has 2 backends
+
+	Scenario: Requests are passed to every backend
+		When the site is started
+		And data is sent with POST to / 20 times with 4 concurrent clients
+			"""
+			upstream-test=1
+			"""
+		Then every response is OK
+		And the logs of 2 backends contain:
+			"""
+			POST / 200
+			"""
+
+	Scenario: Backends are resolved periodically with a resolver
+		Given the frontend environment variable FASTCGI_RESOLVER is "127.0.0.11"
+		When the site is started
+		And data is sent with POST to / 20 times with 4 concurrent clients
+			"""
+			upstream-test=2
+			"""
+		Then every response is OK
+		And the logs of 2 backends contain:
+			"""
+			POST / 200
+			"""
+		And /etc/nginx/conf.d/upstream.conf in the frontend contains "resolver 127.0.0.11"
@@ -10,50 +10,97 @@ Management and control for WordPress fixtures
 
 from __future__ import annotations
 
+import json
+import logging
+from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from contextlib import contextmanager
+from functools import cache
+from hashlib import sha256
 from os import environ
+from os import getpid
 from pathlib import Path
+from secrets import token_hex
+from subprocess import DEVNULL
+from subprocess import PIPE
+from subprocess import STDOUT
+from subprocess import Popen
+from subprocess import run
+from tempfile import TemporaryDirectory
+from threading import Lock
+from threading import Timer
+from time import monotonic
+from time import sleep
+from types import TracebackType
 from typing import Iterator
 
 from behave import fixture
 from behave import use_fixture
 from behave.runner import Context
 from behave_utils import URL
-from behave_utils import wait
+from behave_utils.docker import DOCKER
 from behave_utils.docker import Cli
 from behave_utils.docker import Container as Container
 from behave_utils.docker import Image
 from behave_utils.docker import IPv4Address
 from behave_utils.docker import Network
+from behave_utils.docker import ShaID
+from behave_utils.docker import docker_quiet
 from behave_utils.docker import inspect
 from behave_utils.mysql import Mysql
 from typing_extensions import Self
 
 BUILD_CONTEXT = Path(__file__).parent.parent
+BUILD_INPUTS = ["Dockerfile", "data", "plugins", "scripts"]
+IMAGE_CACHE_VAR = "WP_TEST_IMAGE_CACHE"
 DEFAULT_URL = URL("http://test.example.com")
 CURRENT_SITE = URL("current://")
+BACKEND_READY = [b"Completed Wordpress preparation", b"ready to handle connections"]
+FRONTEND_READY = [b"ready for start up"]
+FRONTEND_PORT = 80
+DRAIN_MARKER = Path("/tmp/draining")
+FRONTEND_DRAIN_DELAY = 2
 
 
 class Wordpress(Container):
 	"""
 	Container subclass for a WordPress PHP-FPM container
+
+	The static and media volumes are named uniquely for each instance, so that concurrent
+	sites do not share files; they are removed when the context is exited.
+
+	If "primary" is provided the instance is a replica of another backend of the same site:
+	it shares the primary's environment, and when created uses the primary's image and
+	mounts its volumes, except for the static and media volumes.
+
+	If "cpus" is set before the container is created, its CPU quota is limited to that
+	number of CPUs.
 	"""
 
 	DEFAULT_ALIASES = ("upstream",)
+	PRIVATE_PATHS = (Path("/app/static"), Path("/app/media"))
 
-	def __init__(self, site_url: URL, database: Mysql, network: Network|None = None):
+	def __init__(
+		self,
+		site_url: URL,
+		database: Mysql,
+		network: Network|None = None,
+		primary: Wordpress|None = None,
+	):
+		self.volume_prefix = f"wp{token_hex(6)}"
+		self.volume_names = [f"{self.volume_prefix}-static", f"{self.volume_prefix}-media"]
+		self.primary = primary
+		self.cpus: int|None = primary.cpus if primary else None
 		Container.__init__(
 			self,
-			Image.build(
-				BUILD_CONTEXT,
-				php_version=environ.get("PHP_VERSION"),
-				wp_version=environ.get("WP_VERSION"),
-			),
+			self.build_image(),
 			volumes=[
-				("static", Path("/app/static")),
-				("media", Path("/app/media")),
+				(self.volume_names[0], self.PRIVATE_PATHS[0]),
+				(self.volume_names[1], self.PRIVATE_PATHS[1]),
 			],
-			env=dict(
+			env=primary.env if primary else dict(
 				SITE_URL=site_url,
 				DB_NAME=database.name,
 				DB_USER=database.user,
@@ -63,6 +110,52 @@ class Wordpress(Container):
 			network=network,
 		)
 
+	def __exit__(
+		self,
+		etype: type[BaseException],
+		exc: BaseException,
+		tb: TracebackType,
+	) -> None:
+		Container.__exit__(self, etype, exc, tb)
+		try:
+			docker_quiet("volume", "rm", "--force", *self.volume_names)
+		except Exception:
+			logging.getLogger(__name__).exception("ignoring exception while removing volumes")
+
+	@staticmethod
+	def build_image() -> Image:
+		"""
+		Return the backend image, building it if needed
+		"""
+		return cached_build(
+			php_version=environ.get("PHP_VERSION"),
+			wp_version=environ.get("WP_VERSION"),
+		)
+
+	def get_id(self) -> ShaID:
+		"""
+		Return an identifier for the Docker Container, creating it if needed
+		"""
+		if self.cid is None and self.primary is not None:
+			self.image = self.primary.image
+			self.volumes.extend(
+				volume for volume in self.primary.volumes
+				if not isinstance(volume, tuple) or volume[1] not in self.PRIVATE_PATHS
+			)
+		if self.cid is None and self.cpus is not None:
+			cid = Container.get_id(self)
+			docker_quiet("container", "update", f"--cpus={self.cpus}", cid)
+			return cid
+		return Container.get_id(self)
+
+	def add_volume(self, name: str, path: Path) -> None:
+		"""
+		Mount a named volume in the container which is unique to it, and removed with it
+		"""
+		volume = f"{self.volume_prefix}-{name}"
+		self.volume_names.append(volume)
+		self.volumes.append((volume, path))
+
 	@property
 	def cli(self) -> Cli:
 		"""
@@ -71,14 +164,16 @@ class Wordpress(Container):
 		return Cli(self, "wp")
 
 	@contextmanager
-	def started(self) -> Iterator[Self]:
+	def started(self, wait: bool = True) -> Iterator[Self]:
 		"""
 		Return a context in which the container is guaranteed to be started and running
+
+		Unless "wait" is false, the context is not entered until the backend is ready.
 		"""
 		with self:
 			self.start()
-			cmd = ["bash", "-c", "[[ /proc/1/exe -ef `which php-fpm` ]]"]
-			wait(lambda: self.run(cmd).returncode == 0, timeout=600)
+			if wait:
+				wait_for_ready(self)
 			yield self
 
 
@@ -90,15 +185,33 @@ class Nginx(Container):
 	def __init__(self, backend: Wordpress, network: Network|None = None):
 		Container.__init__(
 			self,
-			Image.build(
-				BUILD_CONTEXT,
-				target='nginx',
-				nginx_version=environ.get("NGINX_VERSION"),
-			),
+			self.build_image(),
 			network=network,
 			volumes=backend.volumes,
 		)
 
+	@staticmethod
+	def build_image() -> Image:
+		"""
+		Return the frontend image, building it if needed
+		"""
+		return cached_build(
+			target='nginx',
+			nginx_version=environ.get("NGINX_VERSION"),
+		)
+
+	@contextmanager
+	def started(self) -> Iterator[Self]:
+		"""
+		Return a context in which the container is guaranteed to be started and running
+		"""
+		with self:
+			self.start()
+			wait_for_output(self, FRONTEND_READY)
+			# Nginx reports it is ready before it binds its ports
+			wait_for_port(self, FRONTEND_PORT)
+			yield self
+
 
 class Site:
 	"""
@@ -118,6 +231,7 @@ class Site:
 		self.frontend = frontend
 		self.backend = backend
 		self.database = database
+		self.replicas = list[Wordpress]()
 		self._address: IPv4Address|None = None
 		self._running = False
 
@@ -135,22 +249,66 @@ class Site:
 		):
 			yield cls(site_url, network, frontend, backend, database)
 
+	@property
+	def backends(self) -> list[Wordpress]:
+		"""
+		Return all the backends of the site, the first being the primary backend
+		"""
+		return [self.backend, *self.replicas]
+
+	def add_backend(self) -> Wordpress:
+		"""
+		Add a replica of the primary backend to the site
+
+		Replicas that have been added when the site is started are started with it.
+		"""
+		backend = Wordpress(self.url, self.database, self.network, primary=self.backend)
+		self.replicas.append(backend)
+		return backend
+
 	@contextmanager
 	def running(self) -> Iterator[Self]:
 		"""
 		Return a context in which all containers are guaranteed to be started and running
+
+		All the backends are started together, as the replicas of a deployment would be.
 		"""
 		if self._running:
 			yield self
 			return
 		self._running = True
-		with self.backend.started(), self.frontend.started():
+		with ExitStack() as stack:
+			for backend in self.backends:
+				stack.enter_context(backend.started(wait=False))
+			for backend in self.backends:
+				wait_for_ready(backend)
+			stack.enter_context(self.frontend.started())
 			try:
 				yield self
 			finally:
 				self._running = False
 				self._address = None
 
+	def shutdown(self) -> None:
+		"""
+		Gracefully stop the frontend and backend in the order used for Kubernetes pods
+
+		The backend's "drain" command and the frontend's drain period run concurrently, as
+		they would for "preStop" hooks; afterwards each container is stopped with its stop
+		signal, allowing in-flight requests to finish.
+		"""
+		with ThreadPoolExecutor(max_workers=1) as executor:
+			drain = executor.submit(
+				self.backend.run, ["/bin/entrypoint", "drain"], check=True,
+			)
+			self.frontend.run(
+				["sh", "-c", f"touch {DRAIN_MARKER} && sleep {FRONTEND_DRAIN_DELAY}"],
+				check=True,
+			)
+			self.frontend.stop()
+			drain.result()
+		self.backend.stop()
+
 	@property
 	def address(self) -> IPv4Address:
 		"""
@@ -168,6 +326,194 @@ class Site:
 		return self._address
 
 
+_build_locks = defaultdict[str, Lock](Lock)
+_cache_lock = Lock()
+
+
+def cached_build(target: str = "", **build_args: str|None) -> Image:
+	"""
+	Return an image built from the project, reusing a previous build of the same inputs
+
+	Builds are keyed by their target, build arguments and a hash of the files copied into the
+	images (`BUILD_INPUTS`).  If the environment variable named by `IMAGE_CACHE_VAR` is set,
+	it names a JSON file through which built images are shared with other processes, such as
+	the workers of tests/parallel.py.
+	"""
+	args = {name: value for name, value in build_args.items() if value is not None}
+	key = json.dumps([target, args, hash_inputs()], sort_keys=True)
+	key = sha256(key.encode()).hexdigest()
+	with _build_locks[key]:
+		with _cache_lock:
+			iid = _read_image_cache().get(key)
+		if iid is not None and _image_exists(iid):
+			return Image(iid)
+		image = Image.build(BUILD_CONTEXT, target, **args)
+		with _cache_lock:
+			cache = _read_image_cache()
+			cache[key] = image.get_id()
+			_write_image_cache(cache)
+		return image
+
+
+def bake_image(base: Image, *configs: Path) -> Image:
+	"""
+	Return a child of a backend image, with the components configured in files baked into it
+
+	The configuration files are copied into /etc/wordpress in the child image before the
+	entrypoint's "bake" command is run, as shown in doc/configuration.md.
+	"""
+	with TemporaryDirectory() as tdir:
+		build_context = Path(tdir)
+		dockerfile = [f"FROM {base.get_id()}"]
+		for config in configs:
+			(build_context / config.name).write_bytes(config.read_bytes())
+			dockerfile.append(f"COPY {config.name} /etc/wordpress/")
+		dockerfile.append('RUN ["/bin/entrypoint", "bake"]')
+		(build_context / "Dockerfile").write_text("\n".join(dockerfile) + "\n")
+		return Image.build(build_context)
+
+
+def prebuild_images(*versions: Mapping[str, str]) -> None:
+	"""
+	Concurrently build the backend and frontend images for each set of versions
+
+	Each set of versions is a mapping like `os.environ`, with any of the keys "PHP_VERSION",
+	"WP_VERSION" and "NGINX_VERSION".
+	"""
+	with ThreadPoolExecutor() as executor:
+		builds = [
+			executor.submit(
+				cached_build,
+				php_version=version.get("PHP_VERSION"),
+				wp_version=version.get("WP_VERSION"),
+			)
+			for version in versions
+		] + [
+			executor.submit(
+				cached_build,
+				target="nginx",
+				nginx_version=version.get("NGINX_VERSION"),
+			)
+			for version in versions
+		]
+		for build in builds:
+			build.result()
+
+
+@cache
+def hash_inputs() -> str:
+	"""
+	Return a hash of the files in the build context which are copied into images
+
+	The hash is calculated once per session.
+	"""
+	digest = sha256()
+	for name in BUILD_INPUTS:
+		path = BUILD_CONTEXT / name
+		for item in sorted(path.rglob("*")) if path.is_dir() else [path]:
+			if item.is_file():
+				digest.update(str(item.relative_to(BUILD_CONTEXT)).encode())
+				digest.update(item.read_bytes())
+	return digest.hexdigest()
+
+
+_session_images = dict[str, ShaID]()
+
+
+def _read_image_cache() -> dict[str, ShaID]:
+	if IMAGE_CACHE_VAR not in environ:
+		return _session_images
+	try:
+		with open(environ[IMAGE_CACHE_VAR]) as cache:
+			return {key: ShaID(iid) for key, iid in json.load(cache).items()}
+	except FileNotFoundError:
+		return {}
+
+
+def _write_image_cache(cache: dict[str, ShaID]) -> None:
+	if IMAGE_CACHE_VAR not in environ:
+		return
+	path = Path(environ[IMAGE_CACHE_VAR])
+	temp = path.with_name(f".{path.name}.{getpid()}")
+	temp.write_text(json.dumps(cache))
+	temp.replace(path)
+
+
+def _image_exists(iid: ShaID) -> bool:
+	cmd = [DOCKER, "image", "inspect", iid]
+	return run(cmd, stdout=DEVNULL, stderr=DEVNULL).returncode == 0
+
+
+def read_logs(container: Container) -> bytes:
+	"""
+	Return the output of a container so far, with stdout and stderr combined
+	"""
+	cmd = [DOCKER, "logs", container.get_id()]
+	return run(cmd, stdout=PIPE, stderr=STDOUT, check=True).stdout
+
+
+def wait_for_ready(backend: Wordpress) -> None:
+	"""
+	Block until a backend has finished preparing Wordpress and PHP-FPM is ready
+	"""
+	wait_for_output(backend, BACKEND_READY, timeout=600)
+
+
+def wait_for_output(
+	container: Container,
+	markers: list[bytes],
+	timeout: float = 120,
+) -> None:
+	"""
+	Block until each of the markers has been output by a container, in order
+
+	The container's log stream is followed from when the container was last (re)started, so
+	the markers are detected as soon as they are written, and markers from a previous run
+	are ignored.  If the container exits first `subprocess.CalledProcessError` is raised; if
+	the timeout passes first `TimeoutError` is raised.
+	"""
+	pending = list(markers)
+	since = inspect(container).path("$.State.StartedAt", str)
+	cmd = [DOCKER, "logs", "--follow", f"--since={since}", container.get_id()]
+	with Popen(cmd, stdout=PIPE, stderr=STDOUT) as proc:
+		assert proc.stdout is not None
+		timer = Timer(timeout, proc.kill)
+		timer.start()
+		try:
+			for line in proc.stdout:
+				if pending[0] in line:
+					del pending[0]
+				if not pending:
+					return
+		finally:
+			timer.cancel()
+			proc.kill()
+	container.is_running(raise_on_exit=True)
+	raise TimeoutError(f"{container.get_id()} did not output {pending[0]!r}")
+
+
+def wait_for_port(container: Container, port: int, timeout: float = 30) -> None:
+	"""
+	Block until a container has a TCP socket listening on a port
+
+	Listening sockets are found in the container's /proc/net/tcp tables, which list local
+	addresses as hexadecimal "address:port" pairs and the listening state as "0A".
+	"""
+	suffix = f":{port:04X}"
+	end = monotonic() + timeout
+	while monotonic() < end:
+		tables = container.run(
+			["cat", "/proc/net/tcp", "/proc/net/tcp6"], capture_output=True,
+		).stdout.decode()
+		for line in tables.splitlines():
+			fields = line.split()
+			if len(fields) > 3 and fields[1].endswith(suffix) and fields[3] == "0A":
+				return
+		container.is_running(raise_on_exit=True)
+		sleep(0.2)
+	raise TimeoutError(f"{container.get_id()} is not listening on port {port}")
+
+
 @fixture
 def site_fixture(context: Context, /, url: URL = CURRENT_SITE) -> Iterator[Site]:
 	"""